@@ -0,0 +1,250 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from db_config import get_connection
+
+# Sales and stock analytics over typed pandas frames. Rows are pulled with an
+# unbuffered cursor FETCH_BATCH at a time and each batch is converted to
+# typed columns straight away (categoricals for the repeated labels, datetime
+# for dates, float for prices), so a long date range never sits in memory as
+# Python row tuples. Every figure is a groupby over those columns.
+
+FETCH_BATCH = 5000
+
+# Results are cached per (report, date range); sales written by other
+# processes show up after at most this many seconds.
+RESULT_TTL = 300
+MAX_CACHED = 64
+
+AGE_BUCKETS = [0, 30, 60, 90, 180, float("inf")]
+AGE_LABELS = ["0-30", "31-60", "61-90", "91-180", "180+"]
+
+SALES_QUERY = """
+    SELECT 'b2c_tv' AS sale_type, brand, size, '' AS item_name, '' AS labour_name,
+           1 AS units, price, sale_date
+    FROM b2c_tv_sales WHERE sale_date BETWEEN %s AND %s
+    UNION ALL
+    SELECT 'b2b_tv', brand, size, '', '', 1, price, sale_date
+    FROM b2b_tv_sales WHERE sale_date BETWEEN %s AND %s
+    UNION ALL
+    SELECT 'b2c_accessory', '', '', item_name, COALESCE(labour_name, ''), quantity, price, sale_date
+    FROM b2c_accessory_sales WHERE sale_date BETWEEN %s AND %s
+"""
+SALES_TYPES = {
+    "sale_type": "category",
+    "brand": "category",
+    "size": "category",
+    "item_name": "category",
+    "labour_name": "category",
+    "units": "numeric",
+    "price": "numeric",
+    "sale_date": "datetime",
+}
+
+# Only available units, so the cost doesn't grow with the sales history
+# (status leads idx_tv_inventory_status_added)
+AVAILABLE_QUERY = "SELECT brand, size, added_at FROM tv_inventory WHERE status = 'available'"
+AVAILABLE_TYPES = {
+    "brand": "category",
+    "size": "category",
+    "added_at": "datetime",
+}
+AVAILABLE_COUNTS_QUERY = """
+    SELECT brand, size, COUNT(*) AS available
+    FROM tv_inventory
+    WHERE status = 'available'
+    GROUP BY brand, size
+"""
+AVAILABLE_COUNTS_TYPES = {
+    "brand": "category",
+    "size": "category",
+    "available": "numeric",
+}
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def _typed(frame, types):
+    for column, kind in types.items():
+        if kind == "category":
+            frame[column] = frame[column].fillna("").astype(str).astype("category")
+        elif kind == "datetime":
+            frame[column] = pd.to_datetime(frame[column], errors="coerce")
+        else:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce").fillna(0).astype("float64")
+    return frame
+
+
+def load_frame(query, params, types):
+    conn = get_connection()
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        batches = []
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            batches.append(_typed(pd.DataFrame.from_records(rows, columns=columns), types))
+        cursor.close()
+    finally:
+        conn.close()
+
+    if not batches:
+        return _typed(pd.DataFrame(columns=columns), types)
+    if len(batches) == 1:
+        return batches[0]
+
+    # Plain concat turns categoricals with different categories into object
+    # columns; union them per column instead.
+    frame = pd.concat(batches, ignore_index=True)
+    for column, kind in types.items():
+        if kind == "category":
+            frame[column] = union_categoricals([batch[column] for batch in batches], ignore_order=True)
+    return frame
+
+
+def load_sales(start, end):
+    # start, end: datetime.date, inclusive
+    return load_frame(SALES_QUERY, (start, end) * 3, SALES_TYPES)
+
+
+def load_available():
+    return load_frame(AVAILABLE_QUERY, (), AVAILABLE_TYPES)
+
+
+def load_available_counts():
+    return load_frame(AVAILABLE_COUNTS_QUERY, (), AVAILABLE_COUNTS_TYPES)
+
+
+def _cached(key, compute):
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and now - hit[0] < RESULT_TTL:
+            _cache.move_to_end(key)
+            return hit[1]
+
+    result = compute()
+
+    with _cache_lock:
+        _cache[key] = (now, result)
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+    return result
+
+
+def _records(frame):
+    # JSON-ready rows: categoricals as strings, NaN as None, floats rounded
+    if any(name is not None for name in frame.index.names):
+        frame = frame.reset_index()
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(str)
+        elif pd.api.types.is_float_dtype(frame[column]):
+            frame[column] = frame[column].round(2)
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def _change(current, previous):
+    return round((current - previous) / previous * 100, 2) if previous else None
+
+
+def previous_period(start, end):
+    # The same number of days immediately before start
+    days = (end - start).days + 1
+    return start - timedelta(days=days), start - timedelta(days=1)
+
+
+def revenue_comparison(start, end):
+    def compute():
+        prev_start, prev_end = previous_period(start, end)
+        sales = load_sales(prev_start, end)
+        sales["period"] = (sales["sale_date"] >= pd.Timestamp(start)).map({True: "current", False: "previous"})
+
+        by_type = (
+            sales.groupby(["sale_type", "period"], observed=True)["price"].sum()
+            .unstack("period").reindex(columns=["current", "previous"]).fillna(0)
+        )
+        previous = by_type["previous"]
+        by_type["change_pct"] = ((by_type["current"] - previous) / previous.where(previous != 0) * 100).round(2)
+
+        current = sales[sales["period"] == "current"]
+        daily = current.groupby(current["sale_date"].dt.date)["price"].sum()
+
+        totals = sales.groupby("period")["price"].sum()
+        total_current = float(totals.get("current", 0))
+        total_previous = float(totals.get("previous", 0))
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "previous_start": prev_start.isoformat(),
+            "previous_end": prev_end.isoformat(),
+            "revenue": round(total_current, 2),
+            "previous_revenue": round(total_previous, 2),
+            "change_pct": _change(total_current, total_previous),
+            "by_type": _records(by_type),
+            "daily": [{"date": d.isoformat(), "revenue": round(float(v), 2)} for d, v in daily.items()],
+        }
+    return _cached(("revenue", start, end), compute)
+
+
+def sell_through(start, end):
+    # Per brand/size: TVs sold in the range / (sold in the range + still
+    # available now)
+    def compute():
+        sales = load_sales(start, end)
+        tv_sales = sales[sales["sale_type"].isin(["b2c_tv", "b2b_tv"])]
+        sold = tv_sales.groupby(["brand", "size"], observed=True)["units"].sum().rename("sold").reset_index()
+
+        on_hand = load_available_counts()
+
+        # The two frames have different brand/size categories, so the merge
+        # keys come out as plain strings
+        frame = sold.merge(on_hand, on=["brand", "size"], how="outer")
+        frame[["sold", "available"]] = frame[["sold", "available"]].fillna(0).astype("int64")
+        frame["sell_through_pct"] = (frame["sold"] / (frame["sold"] + frame["available"]) * 100).round(2)
+        frame = frame.sort_values(["sell_through_pct", "brand", "size"], ascending=[False, True, True])
+        return {"start": start.isoformat(), "end": end.isoformat(), "rows": _records(frame)}
+    return _cached(("sell_through", start, end), compute)
+
+
+def stock_ageing(as_of=None):
+    # Available TVs by days since added_at, per brand/size and age bucket
+    as_of = as_of or date.today()
+
+    def compute():
+        available = load_available()
+        # Units from before added_at was recorded have no age
+        unknown = int(available["added_at"].isna().sum())
+        available = available[available["added_at"].notna()].copy()
+        available["age_days"] = (pd.Timestamp(as_of) - available["added_at"]).dt.days.clip(lower=0)
+        available["bucket"] = pd.cut(
+            available["age_days"], AGE_BUCKETS, labels=AGE_LABELS, right=True, include_lowest=True
+        )
+
+        summary = available.groupby(["brand", "size"], observed=True)["age_days"].agg(
+            units="count", avg_age_days="mean", max_age_days="max"
+        )
+        buckets = (
+            available.groupby(["brand", "size", "bucket"], observed=True).size()
+            .unstack("bucket").reindex(columns=AGE_LABELS).fillna(0).astype("int64")
+        )
+        frame = summary.join(buckets).sort_values("max_age_days", ascending=False)
+        totals = available["bucket"].value_counts().reindex(AGE_LABELS).fillna(0).astype("int64")
+        return {
+            "as_of": as_of.isoformat(),
+            "units": int(len(available)),
+            "unknown_age_units": unknown,
+            "buckets": {label: int(count) for label, count in totals.items()},
+            "rows": _records(frame),
+        }
+    return _cached(("stock_ageing", as_of, as_of), compute)
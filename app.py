@@ -1,11 +1,112 @@
-from flask import Flask, render_template, request, redirect, session, url_for, send_file, jsonify
-from db_config import get_connection
+from flask import Flask, Response, g, render_template, request, redirect, session, url_for, send_file, jsonify
+from db_config import get_connection, pool_stats
+import dashboard_stats
+import serial_index
+import item_index
+import tv_import
+import orders
+import analytics
+import sales_rollup
+import tv_sales
+import stock
+import stock_ledger
+import stock_alerts
+import inventory_changes
+import exports
+import sales_search
+import migrations
+import export_jobs
+import db_metrics
+import request_profiler
+import session_store
+import auth
 import pandas as pd
 import io
-from datetime import datetime
+import json
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
-app.secret_key = "your_secret_key"
+# Sessions are kept server side (see session_store.py); the cookie only
+# carries a random id, so the key is just for anything else Flask signs
+app.secret_key = os.environ.get("IMS_SECRET_KEY") or secrets.token_hex(32)
+app.session_interface = session_store.ServerSideSessionInterface(session_store.store)
+
+# Report schema drift at startup rather than as slow queries later
+try:
+    for table, index in migrations.missing_indexes():
+        app.logger.warning("Missing index %s on %s (run: python migrations.py)", index, table)
+except Exception as e:
+    app.logger.warning("Could not check indexes: %s", e)
+
+# Per-request query instrumentation: Server-Timing header, one structured
+# log line per request and per-route histograms for /metrics
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    db_metrics.start_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+def finish_request_metrics(status):
+    duration = time.perf_counter() - g.request_started
+    stats = db_metrics.finish_request(status, duration)
+    if stats is None:
+        return None
+    app.logger.info(json.dumps({
+        "event": "request",
+        "method": request.method,
+        "route": stats.route,
+        "path": request.path,
+        "status": status,
+        "duration_ms": round(duration * 1000, 3),
+        "db_ms": round(stats.db_time * 1000, 3),
+        "queries": stats.queries,
+        "rows": stats.rows,
+        "slow_queries": stats.slow,
+    }))
+    return db_metrics.server_timing(stats, duration)
+
+@app.after_request
+def add_server_timing(response):
+    timing = finish_request_metrics(response.status_code)
+    if timing:
+        response.headers["Server-Timing"] = timing
+    return response
+
+@app.teardown_request
+def finish_failed_request_metrics(exc):
+    # after_request is skipped when an exception propagates (debug, testing)
+    if exc is not None and db_metrics.current() is not None:
+        finish_request_metrics(500)
+
+# Opt-in profiling of single requests (see request_profiler.py)
+@app.before_request
+def start_profile():
+    if not request_profiler.ENABLED:
+        return
+    flagged = request.headers.get(request_profiler.HEADER) == "1" or request_profiler.QUERY_FLAG in request.args
+    if request_profiler.wanted(session.get("user"), flagged):
+        g.profile = request_profiler.start(
+            request.method, request.full_path, request.url_rule.rule if request.url_rule else "unmatched"
+        )
+
+@app.after_request
+def finish_profile(response):
+    capture = g.get("profile")
+    if capture:
+        # Streamed bodies (the CSV exports) run after this hook, so stop
+        # once the response has been sent
+        response.headers["X-Profile-Id"] = capture.id
+        status = response.status_code
+        response.call_on_close(lambda: request_profiler.finish(capture, status))
+    return response
+
+@app.teardown_request
+def finish_failed_profile(exc):
+    capture = g.get("profile")
+    if exc is not None and capture:
+        request_profiler.finish(capture, 500)
 
 def format_date(d):
     try:
@@ -22,16 +123,16 @@ def login():
         
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT * FROM admin_login 
-            WHERE (username = %s OR phone_no = %s) AND password = %s
-        """, (username, username, password))
-        
-        user = cursor.fetchone()
-        conn.close()
+        try:
+            user = auth.authenticate(cursor, username, password)
+            # Commits a rehashed password, if authenticate upgraded one
+            conn.commit()
+        finally:
+            conn.close()
         
         if user:
+            session.clear()
+            session.regenerate()
             session["user"] = user["username"]
             return redirect(url_for("dashboard"))
         else:
@@ -45,75 +146,63 @@ def dashboard():
     if "user" not in session:
         return redirect(url_for("login"))
     
+    stats = dashboard_stats.get_stats()
+    return render_template("dashboard.html", **stats)
+
+
+# Available TVs (keyset pagination for the dashboard table)
+AVAILABLE_TVS_PAGE_SIZE = 50
+AVAILABLE_TVS_MAX_PAGE_SIZE = 200
+
+@app.route("/available_tvs")
+def available_tvs():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    brand = request.args.get("brand", "").strip()
+    size = request.args.get("size", "").strip()
+    try:
+        after_id = int(request.args.get("after_id", 0))
+        limit = int(request.args.get("limit", AVAILABLE_TVS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "after_id and limit must be integers"}), 400
+    limit = max(1, min(limit, AVAILABLE_TVS_MAX_PAGE_SIZE))
+
+    query = """
+        SELECT id, serial_number, brand, size
+        FROM tv_inventory
+        WHERE status = 'available' AND id > %s
+    """
+    params = [after_id]
+
+    if brand:
+        query += " AND brand = %s"
+        params.append(brand)
+
+    if size:
+        query += " AND size = %s"
+        params.append(size)
+
+    # Fetch one extra row to know whether another page exists
+    query += " ORDER BY id ASC LIMIT %s"
+    params.append(limit + 1)
+
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-    
-    try:
-        # Get available TVs
-        cursor.execute("""
-            SELECT id, serial_number, brand, size 
-            FROM tv_inventory 
-            WHERE status = 'available'
-        """)
-        available_tvs = cursor.fetchall()
 
-        # 🔽 GET DISTINCT BRANDS
-        cursor.execute("""
-            SELECT DISTINCT brand 
-            FROM tv_inventory 
-            WHERE status = 'available'
-            ORDER BY brand ASC
-        """)
-        tv_brands = [row['brand'] for row in cursor.fetchall()]
-
-        # Get counts
-        cursor.execute("SELECT COUNT(*) as total FROM tv_inventory")
-        total_stock = cursor.fetchone()["total"]
-        
-        cursor.execute("SELECT COUNT(*) as available FROM tv_inventory WHERE status = 'available'")
-        available_count = cursor.fetchone()["available"]
-        
-        cursor.execute("SELECT COUNT(*) as count FROM b2c_tv_sales")
-        b2c_sales = cursor.fetchone()["count"]
-        
-        cursor.execute("SELECT COUNT(*) as count FROM b2b_tv_sales")
-        b2b_sales = cursor.fetchone()["count"]
-        
-        # Get accessory counts
-        cursor.execute("""
-            SELECT 
-                SUM(main_stock) as main_total,
-                SUM(prabhu_stock) as prabhu_total,
-                SUM(tamil_stock) as tamil_total
-            FROM accessory_stock
-        """)
-        accessory_counts = cursor.fetchone()
-        
-        total_accessories = (accessory_counts['main_total'] or 0) + \
-                            (accessory_counts['prabhu_total'] or 0) + \
-                            (accessory_counts['tamil_total'] or 0)
-        
-        # 🔽 Get all accessory items for display
-        cursor.execute("SELECT item_name, main_stock, prabhu_stock, tamil_stock FROM accessory_stock")
-        accessory_items = cursor.fetchall()
-        
-        return render_template(
-            "dashboard.html",
-            available_tvs=available_tvs,
-            tv_brands=tv_brands,  # ✅ Add this line to pass brands to HTML
-            total_stock=total_stock,
-            available_count=available_count,
-            b2c_sales=b2c_sales,
-            b2b_sales=b2b_sales,
-            total_accessories=total_accessories,
-            main_stock=accessory_counts['main_total'] or 0,
-            prabhu_stock=accessory_counts['prabhu_total'] or 0,
-            tamil_stock=accessory_counts['tamil_total'] or 0,
-            accessory_items=accessory_items
-        )
+    try:
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
     finally:
         conn.close()
 
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "tvs": rows,
+        "next_after_id": rows[-1]["id"] if has_more else None
+    })
+
 
 # Add Stock Route
 @app.route("/add_stock")
@@ -146,7 +235,17 @@ def add_tv():
             INSERT INTO tv_inventory (serial_number, brand, size, status)
             VALUES (%s, %s, %s, 'available')
         """, (serial, brand, size))
+        new_id = cursor.lastrowid
+        inventory_changes.record_added(cursor, serial)
         conn.commit()
+        dashboard_stats.invalidate()
+        serial_index.put({
+            "id": new_id,
+            "serial_number": serial,
+            "brand": brand,
+            "size": size,
+            "status": "available"
+        })
         return redirect(url_for("dashboard"))
     except Exception as e:
         conn.rollback()
@@ -154,6 +253,44 @@ def add_tv():
     finally:
         conn.close()
 
+# Bulk TV Import Route
+@app.route("/import_tvs", methods=["POST"])
+def import_tvs():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    try:
+        rows = tv_import.read_rows(upload)
+    except tv_import.TVImportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_connection()
+    try:
+        report, added = tv_import.import_rows(conn, rows)
+        conn.commit()
+    except tv_import.TVImportError as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Error importing TVs: {str(e)}"}), 500
+    finally:
+        conn.close()
+
+    if added:
+        dashboard_stats.invalidate()
+        serial_index.put_many(added)
+
+    return jsonify({
+        "accepted": len(added),
+        "rejected": len(report) - len(added),
+        "rows": report
+    })
+
 # Add Accessory Route
 @app.route("/add_accessory", methods=["POST"])
 def add_accessory():
@@ -174,22 +311,17 @@ def add_accessory():
         cursor.execute("SELECT id FROM accessory_stock WHERE item_name = %s", (name,))
         existing = cursor.fetchone()
         
-        if existing:
-            # Update existing stock (only main stock now)
-            cursor.execute("""
-                UPDATE accessory_stock 
-                SET main_stock = main_stock + %s
-                WHERE item_name = %s
-            """, (main, name))
-        else:
-            # Add new accessory (with zero stock for Prabhu and Tamil)
-            cursor.execute("""
-                INSERT INTO accessory_stock 
-                (item_name, main_stock, prabhu_stock, tamil_stock)
-                VALUES (%s, %s, 0, 0)
-            """, (name, main))
+        if not existing:
+            cursor.execute("INSERT INTO accessory_stock (item_name) VALUES (%s)", (name,))
+
+        # New stock always arrives at the main location
+        stock.add(cursor, name, stock.DEFAULT_LOCATION, main, "received")
             
         conn.commit()
+        dashboard_stats.invalidate()
+        stock_ledger.maybe_snapshot()
+        if not existing:
+            item_index.add(name)
         return redirect(url_for("dashboard"))
     except Exception as e:
         conn.rollback()
@@ -208,44 +340,14 @@ def submit_b2c_tv_sale():
         return "Serial number required", 400
     
     conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
     try:
-        # ✅ Step 1: Fetch TV details (ID, brand, size)
-        cursor.execute("""
-            SELECT id, brand, size FROM tv_inventory 
-            WHERE serial_number = %s AND status = 'available'
-            FOR UPDATE
-        """, (serial,))
-        tv = cursor.fetchone()
-        
+        mode = tv_sales.parse_mode(request.values.get("lock_mode"))
+        tv = tv_sales.sell(conn, "b2c", serial, request.form, mode)
         if not tv:
             return "TV not found or already sold", 404
 
-        # ✅ Step 2: Insert sale using values from inventory
-        cursor.execute("""
-            INSERT INTO b2c_tv_sales (
-                product_id, customer_name, phone, price, sale_date, warranty, brand, size
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            tv["id"],
-            request.form.get("name"),
-            request.form.get("phone"),
-            request.form.get("price"),
-            request.form.get("date"),
-            request.form.get("warranty"),
-            tv["brand"],
-            tv["size"]
-        ))
-        
-        # ✅ Step 3: Mark TV as sold
-        cursor.execute("""
-            UPDATE tv_inventory 
-            SET status = 'sold' 
-            WHERE id = %s
-        """, (tv["id"],))
-        
-        conn.commit()
+        dashboard_stats.invalidate()
+        serial_index.set_sold(tv["id"])
         return redirect(url_for("dashboard"))
 
     except Exception as e:
@@ -255,6 +357,35 @@ def submit_b2c_tv_sale():
     finally:
         conn.close()
 
+# Batch Order Submission (multiple TVs and accessory lines, one transaction)
+@app.route("/submit_order", methods=["POST"])
+def submit_order():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    conn = get_connection()
+    try:
+        tv_ids, created = orders.submit_order(conn, request.get_json(silent=True))
+        conn.commit()
+    except orders.OrderError as e:
+        conn.rollback()
+        body = {"error": str(e)}
+        if e.details:
+            body.update(e.details)
+        return jsonify(body), e.status
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Error processing order: {str(e)}"}), 500
+    finally:
+        conn.close()
+
+    dashboard_stats.invalidate()
+    stock_ledger.maybe_snapshot()
+    for tv_id in tv_ids:
+        serial_index.set_sold(tv_id)
+
+    return jsonify(created), 201
+
 @app.route("/edit_tv", methods=["POST"])
 def edit_tv():
     if "user" not in session:
@@ -271,12 +402,28 @@ def edit_tv():
         if not all([tv_id, serial, brand, size]):
             return "Missing required fields", 400
 
+        cursor.execute("""
+            SELECT id, serial_number, status FROM tv_inventory
+            WHERE id = %s
+            FOR UPDATE
+        """, (tv_id,))
+        current = cursor.fetchone()
+        if not current:
+            return "TV not found", 404
+        found_id, old_serial, status = current
+
         cursor.execute("""
             UPDATE tv_inventory 
             SET serial_number = %s, brand = %s, size = %s 
             WHERE id = %s
         """, (serial, brand, size, tv_id))
+
+        if old_serial != serial and status == "available":
+            inventory_changes.record_removed(cursor, old_serial)
+            inventory_changes.record_added(cursor, serial)
         conn.commit()
+        dashboard_stats.invalidate()
+        serial_index.put({"id": found_id, "serial_number": serial, "brand": brand, "size": size, "status": status})
         return redirect(url_for("dashboard"))
     except Exception as e:
         conn.rollback()
@@ -295,44 +442,14 @@ def submit_b2b_tv_sale():
         return "Serial number required", 400
     
     conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
     try:
-        # ✅ Step 1: Fetch TV details (ID, brand, size)
-        cursor.execute("""
-            SELECT id, brand, size FROM tv_inventory 
-            WHERE serial_number = %s AND status = 'available'
-            FOR UPDATE
-        """, (serial,))
-        tv = cursor.fetchone()
-        
+        mode = tv_sales.parse_mode(request.values.get("lock_mode"))
+        tv = tv_sales.sell(conn, "b2b", serial, request.form, mode)
         if not tv:
             return "TV not found or already sold", 404
 
-        # ✅ Step 2: Insert sale using values from inventory
-        cursor.execute("""
-            INSERT INTO b2b_tv_sales (
-                product_id, business_name, phone, price, sale_date, warranty, brand, size
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            tv["id"],
-            request.form.get("name"),
-            request.form.get("phone"),
-            request.form.get("price"),
-            request.form.get("date"),
-            request.form.get("warranty"),
-            tv["brand"],
-            tv["size"]
-        ))
-        
-        # ✅ Step 3: Mark TV as sold
-        cursor.execute("""
-            UPDATE tv_inventory 
-            SET status = 'sold' 
-            WHERE id = %s
-        """, (tv["id"],))
-        
-        conn.commit()
+        dashboard_stats.invalidate()
+        serial_index.set_sold(tv["id"])
         return redirect(url_for("dashboard"))
 
     except Exception as e:
@@ -358,30 +475,8 @@ def submit_accessory_sale():
     cursor = conn.cursor()
     
     try:
-        # Check stock availability
-        if labour == "prabhu":  # Prabhu
-            cursor.execute("""
-                SELECT prabhu_stock FROM accessory_stock 
-                WHERE item_name = %s AND prabhu_stock >= %s
-                FOR UPDATE
-            """, (item_name, quantity))
-        elif labour == "tamil":  # Tamil
-            cursor.execute("""
-                SELECT tamil_stock FROM accessory_stock 
-                WHERE item_name = %s AND tamil_stock >= %s
-                FOR UPDATE
-            """, (item_name, quantity))
-        else:
-            cursor.execute("""
-                SELECT main_stock FROM accessory_stock 
-                WHERE item_name = %s AND main_stock >= %s
-                FOR UPDATE
-            """, (item_name, quantity))
-            
-        stock = cursor.fetchone()
-        if not stock:
-            return "Insufficient stock", 400
-        
+        labour = labour or stock.DEFAULT_LOCATION
+
         # Record sale
         cursor.execute("""
             INSERT INTO b2c_accessory_sales (
@@ -397,28 +492,18 @@ def submit_accessory_sale():
             request.form.get("price"),
             request.form.get("date")
         ))
-        
-        # Update inventory
-        if labour == "prabhu":  # Prabhu
-            cursor.execute("""
-                UPDATE accessory_stock 
-                SET prabhu_stock = prabhu_stock - %s
-                WHERE item_name = %s
-            """, (quantity, item_name))
-        elif labour == "tamil":  # Tamil
-            cursor.execute("""
-                UPDATE accessory_stock 
-                SET tamil_stock = tamil_stock - %s
-                WHERE item_name = %s
-            """, (quantity, item_name))
-        else:
-            cursor.execute("""
-                UPDATE accessory_stock 
-                SET main_stock = main_stock - %s
-                WHERE item_name = %s
-            """, (quantity, item_name))
+
+        sale_id = cursor.lastrowid
+
+        # Update inventory; the ledger row references the sale
+        if not stock.take(cursor, item_name, labour, quantity, "sale", sale_id):
+            conn.rollback()
+            return "Insufficient stock", 400
+        sales_rollup.add_sales(cursor, "b2c_accessory", [sale_id])
             
         conn.commit()
+        dashboard_stats.invalidate()
+        stock_ledger.maybe_snapshot()
         return redirect(url_for("dashboard"))
     except Exception as e:
         conn.rollback()
@@ -426,40 +511,45 @@ def submit_accessory_sale():
     finally:
         conn.close()
 
-# Sales History Route (updated)
-from datetime import datetime
+# Sales History Route (keyset paginated)
+SALES_PAGE_SIZE = 50
+SALES_MAX_PAGE_SIZE = 500
 
-@app.route("/sales_history")
-def sales_history():
-    if "user" not in session:
-        return redirect(url_for("login"))
+def encode_cursor(*parts):
+    return "|".join(str(p) for p in parts)
 
-    raw_start = request.args.get("start_date", "").strip()
-    raw_end = request.args.get("end_date", "").strip()
-    search = request.args.get("search", "").strip()
-    sort_order = request.args.get("sort", "DESC").upper()
-    size_filter = request.args.get("size", "").strip()
-    date_error = None
 
-    def format_db_date(d):
-        try:
-            return datetime.strptime(d, "%Y-%m-%d").strftime("%Y-%m-%d")
-        except Exception:
-            return None
+def decode_cursor(raw, count):
+    parts = raw.split("|") if raw else []
+    return parts if len(parts) == count else None
 
-    db_start_date = format_db_date(raw_start)
-    db_end_date = format_db_date(raw_end)
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+def seek_condition(date_col, id_col, sort_order, cursor_date, cursor_id):
+    # Rows strictly after (cursor_date, cursor_id) in the page order
+    op = "<" if sort_order == "DESC" else ">"
+    return (
+        f" AND ({date_col} {op} %s OR ({date_col} = %s AND {id_col} {op} %s))",
+        [cursor_date, cursor_date, cursor_id]
+    )
 
-    try:
-        # TV B2C Query
-        b2c_query = """
-            SELECT 
-                'B2C' AS type,
+
+def tv_sales_page_query(search, size_filter, start_date, end_date, sort_order, after, limit,
+                        search_mode="indexed"):
+    # B2C and B2B sales merged by the database in one ordered UNION ALL. The
+    # page key is (sale_date, type, id) since ids repeat across the two
+    # tables; each branch applies its own part of the seek predicate and
+    # LIMIT so it can stop early on its (sale_date, id) index.
+    branches = []
+    params = []
+    op = "<" if sort_order == "DESC" else ">"
+
+    for sale_type, table, name_col in (("B2C", "b2c_tv_sales", "customer_name"),
+                                       ("B2B", "b2b_tv_sales", "business_name")):
+        branch = f"""
+            SELECT
+                '{sale_type}' AS type,
                 b.id,
-                b.customer_name AS name,
+                b.{name_col} AS name,
                 b.phone,
                 t.brand,
                 t.size,
@@ -467,114 +557,168 @@ def sales_history():
                 b.sale_date,
                 b.warranty,
                 b.price
-            FROM b2c_tv_sales b
+            FROM {table} b
             JOIN tv_inventory t ON b.product_id = t.id
             WHERE 1=1
         """
-        b2c_params = []
+        branch_params = []
 
-        if search:
-            s = f"%{search}%"
-            b2c_query += " AND (b.customer_name LIKE %s OR b.phone LIKE %s OR t.serial_number LIKE %s)"
-            b2c_params += [s, s, s]
+        cond, cond_params = sales_search.search_condition(
+            search, [f"b.{name_col}"], "b.phone", "t.serial_number", mode=search_mode
+        )
+        branch += cond
+        branch_params += cond_params
 
         if size_filter:
-            b2c_query += " AND t.size = %s"
-            b2c_params.append(size_filter)
+            branch += " AND t.size = %s"
+            branch_params.append(size_filter)
 
-        if db_start_date:
-            b2c_query += " AND b.sale_date >= %s"
-            b2c_params.append(db_start_date)
+        if start_date:
+            branch += " AND b.sale_date >= %s"
+            branch_params.append(start_date)
 
-        if db_end_date:
-            b2c_query += " AND b.sale_date <= %s"
-            b2c_params.append(db_end_date)
+        if end_date:
+            branch += " AND b.sale_date <= %s"
+            branch_params.append(end_date)
+
+        if after:
+            after_date, after_type, after_id = after
+            if sale_type == after_type:
+                cond, cond_params = seek_condition("b.sale_date", "b.id", sort_order, after_date, after_id)
+                branch += cond
+                branch_params += cond_params
+            elif (sale_type < after_type) == (sort_order == "DESC"):
+                # This branch sorts after the cursor's type on equal dates
+                branch += f" AND b.sale_date {op}= %s"
+                branch_params.append(after_date)
+            else:
+                branch += f" AND b.sale_date {op} %s"
+                branch_params.append(after_date)
+
+        branch += f" ORDER BY b.sale_date {sort_order}, b.id {sort_order} LIMIT %s"
+        branch_params.append(limit)
+
+        # Derived tables rather than parenthesised UNION members, which
+        # SQLite doesn't accept; each keeps its own ORDER BY and LIMIT
+        branches.append(f"SELECT * FROM ({branch}) AS {sale_type.lower()}")
+        params += branch_params
+
+    query = " UNION ALL ".join(branches)
+    query += f" ORDER BY sale_date {sort_order}, type {sort_order}, id {sort_order} LIMIT %s"
+    params.append(limit)
+    return query, tuple(params)
+
+
+def accessory_sales_page_query(search, start_date, end_date, sort_order, after, limit,
+                               search_mode="indexed"):
+    query = """
+        SELECT
+            id,
+            customer_name,
+            phone,
+            item_name,
+            quantity,
+            labour_name,
+            sale_date,
+            price
+        FROM b2c_accessory_sales
+        WHERE 1=1
+    """
+    params = []
 
-        b2c_query += f" ORDER BY b.sale_date {sort_order}"
-        cursor.execute(b2c_query, tuple(b2c_params))
-        b2c_sales = cursor.fetchall()
+    cond, cond_params = sales_search.search_condition(
+        search, ["customer_name", "item_name"], "phone", mode=search_mode
+    )
+    query += cond
+    params += cond_params
 
-        # TV B2B Query
-        b2b_query = """
-            SELECT 
-                'B2B' AS type,
-                b.id,
-                b.business_name AS name,
-                b.phone,
-                t.brand,
-                t.size,
-                t.serial_number,
-                b.sale_date,
-                b.warranty,
-                b.price
-            FROM b2b_tv_sales b
-            JOIN tv_inventory t ON b.product_id = t.id
-            WHERE 1=1
-        """
-        b2b_params = []
+    if start_date:
+        query += " AND sale_date >= %s"
+        params.append(start_date)
 
-        if search:
-            s = f"%{search}%"
-            b2b_query += " AND (b.business_name LIKE %s OR b.phone LIKE %s OR t.serial_number LIKE %s)"
-            b2b_params += [s, s, s]
+    if end_date:
+        query += " AND sale_date <= %s"
+        params.append(end_date)
 
-        if size_filter:
-            b2b_query += " AND t.size = %s"
-            b2b_params.append(size_filter)
+    if after:
+        cond, cond_params = seek_condition("sale_date", "id", sort_order, after[0], after[1])
+        query += cond
+        params += cond_params
 
-        if db_start_date:
-            b2b_query += " AND b.sale_date >= %s"
-            b2b_params.append(db_start_date)
+    query += f" ORDER BY sale_date {sort_order}, id {sort_order} LIMIT %s"
+    params.append(limit)
+    return query, tuple(params)
 
-        if db_end_date:
-            b2b_query += " AND b.sale_date <= %s"
-            b2b_params.append(db_end_date)
 
-        b2b_query += f" ORDER BY b.sale_date {sort_order}"
-        cursor.execute(b2b_query, tuple(b2b_params))
-        b2b_sales = cursor.fetchall()
+@app.route("/sales_history")
+def sales_history():
+    if "user" not in session:
+        return redirect(url_for("login"))
 
-        tv_sales = b2c_sales + b2b_sales
-        tv_sales.sort(key=lambda x: x['sale_date'], reverse=(sort_order == "DESC"))
+    raw_start = request.args.get("start_date", "").strip()
+    raw_end = request.args.get("end_date", "").strip()
+    search = request.args.get("search", "").strip()
+    sort_order = request.args.get("sort", "DESC").upper()
+    size_filter = request.args.get("size", "").strip()
+    date_error = None
 
-        # Accessory Query
-        acc_query = """
-            SELECT
-                id,
-                customer_name,
-                phone,
-                item_name,
-                quantity,
-                labour_name,
-                sale_date,
-                price
-            FROM b2c_accessory_sales
-            WHERE 1=1
-        """
-        acc_params = []
+    if sort_order not in ("ASC", "DESC"):
+        sort_order = "DESC"
+
+    search_mode = sales_search.parse_mode(request.args.get("search_mode"))
+
+    try:
+        page_size = int(request.args.get("page_size", SALES_PAGE_SIZE))
+    except ValueError:
+        page_size = SALES_PAGE_SIZE
+    page_size = max(1, min(page_size, SALES_MAX_PAGE_SIZE))
+
+    tv_after = decode_cursor(request.args.get("tv_after", ""), 3)
+    acc_after = decode_cursor(request.args.get("acc_after", ""), 2)
 
-        if search:
-            s = f"%{search}%"
-            acc_query += " AND (customer_name LIKE %s OR phone LIKE %s OR item_name LIKE %s)"
-            acc_params += [s, s, s]
+    db_start_date = format_date(raw_start)
+    db_end_date = format_date(raw_end)
 
-        if db_start_date:
-            acc_query += " AND sale_date >= %s"
-            acc_params.append(db_start_date)
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        # One extra row tells us whether there is a next page
+        tv_query, tv_params = tv_sales_page_query(
+            search, size_filter, db_start_date, db_end_date, sort_order, tv_after, page_size + 1,
+            search_mode=search_mode
+        )
+        cursor.execute(tv_query, tv_params)
+        tv_sales = cursor.fetchall()
 
-        if db_end_date:
-            acc_query += " AND sale_date <= %s"
-            acc_params.append(db_end_date)
+        tv_next = None
+        if len(tv_sales) > page_size:
+            tv_sales = tv_sales[:page_size]
+            last = tv_sales[-1]
+            tv_next = encode_cursor(last["sale_date"], last["type"], last["id"])
 
-        acc_query += f" ORDER BY sale_date {sort_order}"
-        cursor.execute(acc_query, tuple(acc_params))
+        acc_query, acc_params = accessory_sales_page_query(
+            search, db_start_date, db_end_date, sort_order, acc_after, page_size + 1,
+            search_mode=search_mode
+        )
+        cursor.execute(acc_query, acc_params)
         accessory_sales = cursor.fetchall()
 
+        acc_next = None
+        if len(accessory_sales) > page_size:
+            accessory_sales = accessory_sales[:page_size]
+            last = accessory_sales[-1]
+            acc_next = encode_cursor(last["sale_date"], last["id"])
+
         return render_template(
             "sales_history.html",
             tv_sales=tv_sales,
             accessory_sales=accessory_sales,
+            tv_next=tv_next,
+            acc_next=acc_next,
+            page_size=page_size,
             search=search,
+            search_mode=search_mode,
             start_date=raw_start,
             end_date=raw_end,
             sort_order=sort_order,
@@ -587,8 +731,67 @@ def sales_history():
     finally:
         conn.close()
 
-      
+
 # Export Routes
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def csv_export_response(query, params, filename):
+    # format=csv streams rows straight from an unbuffered cursor; gzip=1
+    # compresses the stream on the fly.
+    compress = request.args.get("gzip") == "1"
+    rows = exports.stream_rows(query, params)
+    response = Response(
+        exports.csv_chunks(rows, compress=compress),
+        mimetype="application/gzip" if compress else "text/csv"
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={filename}.csv" + (".gz" if compress else "")
+    )
+    return response
+
+
+def xlsx_export_response(query, params, sheet_name, filename):
+    # engine=pandas keeps the original DataFrame path for comparison; the
+    # default streams the cursor into a write-only workbook.
+    engine = request.args.get("engine", "stream")
+    started = time.perf_counter()
+
+    if engine == "pandas":
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        df = pd.DataFrame(rows)
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name=sheet_name)
+        output.seek(0)
+        row_count = len(rows)
+    else:
+        output, row_count = exports.write_xlsx(exports.stream_rows(query, params), sheet_name)
+
+    elapsed = time.perf_counter() - started
+    rows_per_second = row_count / elapsed if elapsed > 0 else 0
+    app.logger.info(
+        "xlsx export %s: engine=%s rows=%d seconds=%.3f rows_per_second=%.0f",
+        filename, engine, row_count, elapsed, rows_per_second
+    )
+
+    response = send_file(
+        output,
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=f"{filename}.xlsx"
+    )
+    response.headers["X-Export-Rows"] = str(row_count)
+    response.headers["X-Export-Rows-Per-Second"] = f"{rows_per_second:.0f}"
+    return response
+
+
 @app.route("/export_tv_sales")
 def export_tv_sales():
     if "user" not in session:
@@ -604,108 +807,15 @@ def export_tv_sales():
     if sort_order not in ("ASC", "DESC"):
         sort_order = "DESC"
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    try:
-        tv_query = """
-        SELECT 
-            'B2C' AS type,
-            b.customer_name AS name,
-            b.phone,
-            t.brand,
-            t.size,
-            t.serial_number,
-            b.sale_date,
-            b.warranty,
-            b.price
-        FROM b2c_tv_sales b
-        JOIN tv_inventory t ON b.product_id = t.id
-        WHERE 1=1
-        """
-        params = []
-
-        if search:
-            tv_query += """
-            AND (
-                b.customer_name LIKE %s OR 
-                b.phone LIKE %s OR 
-                t.serial_number LIKE %s
-            )
-            """
-            search_param = f"%{search}%"
-            params.extend([search_param, search_param, search_param])
-
-        if size_filter:
-            tv_query += " AND t.size = %s"
-            params.append(size_filter)
-
-        if start_date:
-            tv_query += " AND b.sale_date >= %s"
-            params.append(start_date)
+    search_mode = sales_search.parse_mode(request.args.get("search_mode"))
 
-        if end_date:
-            tv_query += " AND b.sale_date <= %s"
-            params.append(end_date)
-
-        tv_query += """
-        UNION ALL
-        SELECT 
-            'B2B' AS type,
-            b.business_name AS name,
-            b.phone,
-            t.brand,
-            t.size,
-            t.serial_number,
-            b.sale_date,
-            b.warranty,
-            b.price
-        FROM b2b_tv_sales b
-        JOIN tv_inventory t ON b.product_id = t.id
-        WHERE 1=1
-        """
+    tv_query, params = exports.tv_sales_query(
+        search, size_filter, start_date, end_date, sort_order, search_mode=search_mode
+    )
 
-        if search:
-            tv_query += """
-            AND (
-                b.business_name LIKE %s OR 
-                b.phone LIKE %s OR 
-                t.serial_number LIKE %s
-            )
-            """
-            params.extend([search_param, search_param, search_param])
-
-        if size_filter:
-            tv_query += " AND t.size = %s"
-            params.append(size_filter)
-
-        if start_date:
-            tv_query += " AND b.sale_date >= %s"
-            params.append(start_date)
-
-        if end_date:
-            tv_query += " AND b.sale_date <= %s"
-            params.append(end_date)
-
-        tv_query += f" ORDER BY sale_date {sort_order}"
-
-        cursor.execute(tv_query, tuple(params))
-        tv_sales = cursor.fetchall()
-
-        df = pd.DataFrame(tv_sales)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="TV Sales")
-
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name="tv_sales_export.xlsx"
-        )
-    finally:
-        conn.close()
+    if request.args.get("format") == "csv":
+        return csv_export_response(tv_query, params, "tv_sales_export")
+    return xlsx_export_response(tv_query, params, "TV Sales", "tv_sales_export")
 
 
 @app.route("/export_accessory_sales")
@@ -722,82 +832,133 @@ def export_accessory_sales():
     if sort_order not in ("ASC", "DESC"):
         sort_order = "DESC"
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    search_mode = sales_search.parse_mode(request.args.get("search_mode"))
 
-    try:
-        accessory_query = """
-        SELECT
-            customer_name,
-            phone,
-            item_name,
-            quantity,
-            labour_name,
-            sale_date,
-            price
-        FROM b2c_accessory_sales
-        WHERE 1=1
-        """
-        params = []
-
-        if search:
-            accessory_query += """
-            AND (
-                customer_name LIKE %s OR
-                phone LIKE %s OR
-                item_name LIKE %s
-            )
-            """
-            search_param = f"%{search}%"
-            params.extend([search_param, search_param, search_param])
+    accessory_query, params = exports.accessory_sales_query(
+        search, start_date, end_date, sort_order, search_mode=search_mode
+    )
 
-        if start_date:
-            accessory_query += " AND sale_date >= %s"
-            params.append(start_date)
+    if request.args.get("format") == "csv":
+        return csv_export_response(accessory_query, params, "accessory_sales_export")
+    return xlsx_export_response(accessory_query, params, "Accessory Sales", "accessory_sales_export")
 
-        if end_date:
-            accessory_query += " AND sale_date <= %s"
-            params.append(end_date)
 
-        accessory_query += f" ORDER BY sale_date {sort_order}"
+# Background Export Jobs
+@app.route("/export_jobs", methods=["POST"])
+def submit_export_job():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
 
-        cursor.execute(accessory_query, tuple(params))
-        accessory_sales = cursor.fetchall()
+    kind = request.values.get("kind", "tv")
+    fmt = request.values.get("format", "xlsx")
+    if kind not in export_jobs.KINDS or fmt not in export_jobs.FORMATS:
+        return jsonify({"error": "Invalid kind or format"}), 400
 
-        df = pd.DataFrame(accessory_sales)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Accessory Sales")
+    sort_order = request.values.get("sort", "DESC").upper()
+    if sort_order not in ("ASC", "DESC"):
+        sort_order = "DESC"
 
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name="accessory_sales_export.xlsx"
-        )
-    finally:
-        conn.close()
+    filters = {
+        "search": request.values.get("search", "").strip(),
+        "size": request.values.get("size", "") if kind == "tv" else "",
+        "start_date": format_date(request.values.get("start_date", "")),
+        "end_date": format_date(request.values.get("end_date", "")),
+        "sort": sort_order,
+        "search_mode": sales_search.parse_mode(request.values.get("search_mode")),
+    }
+
+    job = export_jobs.submit(kind, fmt, filters)
+    return jsonify(job.to_dict()), 202
+
+
+@app.route("/export_jobs/<job_id>")
+def export_job_status(job_id):
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/export_jobs/<job_id>/download")
+def download_export_job(job_id):
+    if "user" not in session:
+        return redirect(url_for("login"))
+
+    job = export_jobs.get(job_id)
+    if not job:
+        return "Export not found or expired", 404
+    if job.status != "done":
+        return f"Export is {job.status}", 409
+
+    mimetype = XLSX_MIMETYPE if job.format == "xlsx" else "text/csv"
+    return send_file(job.path, mimetype=mimetype, as_attachment=True, download_name=job.filename)
 
 
 # Serial Number Validation
+# Supports ETag/If-None-Match on the inventory version and a since=<version>
+# delta mode that returns only serials added/removed after that version. The
+# "version" returned is the one to send next; it may trail the newest change
+# by a few seconds (see inventory_changes.SETTLE_SECONDS).
 @app.route("/get_available_serials")
 def get_available_serials():
+    since = request.args.get("since", "").strip()
+
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            SELECT serial_number 
-            FROM tv_inventory 
-            WHERE status = 'available'
-            ORDER BY serial_number
-        """)
-        serials = [row[0] for row in cursor.fetchall()]
-        return jsonify({"serials": serials})
+        oldest, version, settled = inventory_changes.version_bounds(cursor)
+        # settled moves on as changes age, so a change that commits behind a
+        # newer one still changes the ETag
+        etag = f"{settled}-{version}"
+        if since:
+            etag += f"-delta-{since}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        payload = None
+        if since.isdigit() and oldest - 1 <= int(since) <= version:
+            added, removed = inventory_changes.changes_since(cursor, int(since), version)
+            payload = {"version": settled, "delta": True, "added": added, "removed": removed}
+
+        if payload is None:
+            cursor.execute("""
+                SELECT serial_number 
+                FROM tv_inventory 
+                WHERE status = 'available'
+                ORDER BY serial_number
+            """)
+            serials = [row[0] for row in cursor.fetchall()]
+            payload = {"version": settled, "delta": False, "serials": serials}
+
+        response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     finally:
         conn.close()
-        
+
+# Serial Number Lookup (point lookup + bounded prefix completion)
+@app.route("/lookup_serial")
+def lookup_serial():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    serial = request.args.get("serial", "").strip()
+    if not serial:
+        return jsonify({"tv": None, "completions": []})
+
+    tv = serial_index.lookup(serial)
+    return jsonify({
+        "tv": tv,
+        "completions": serial_index.complete(serial)
+    })
+
 @app.route("/transfer_accessory", methods=["POST"])
 def transfer_accessory():
     if "user" not in session:
@@ -815,25 +976,15 @@ def transfer_accessory():
     cursor = conn.cursor()
     
     try:
-        # Verify sufficient stock
-        cursor.execute(f"""
-            SELECT {from_location}_stock FROM accessory_stock 
-            WHERE item_name = %s AND {from_location}_stock >= %s
-            FOR UPDATE
-        """, (item_name, quantity))
-        
-        if not cursor.fetchone():
+        if not stock.location_exists(cursor, to_location):
+            return f"Unknown location {to_location}", 400
+
+        if not stock.transfer(cursor, item_name, from_location, to_location, quantity):
             return f"Insufficient stock in {from_location}", 400
         
-        # Perform transfer
-        cursor.execute(f"""
-            UPDATE accessory_stock 
-            SET {from_location}_stock = {from_location}_stock - %s,
-                {to_location}_stock = {to_location}_stock + %s
-            WHERE item_name = %s
-        """, (quantity, quantity, item_name))
-        
         conn.commit()
+        dashboard_stats.invalidate()
+        stock_ledger.maybe_snapshot()
         return redirect(url_for("dashboard"))
     except Exception as e:
         conn.rollback()
@@ -851,6 +1002,7 @@ def delete_sale():
 
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    restored_tv = None
 
     try:
         if sale_type in ['b2b_tv', 'b2c_tv']:
@@ -858,7 +1010,12 @@ def delete_sale():
             table = 'b2b_tv_sales' if sale_type == 'b2b_tv' else 'b2c_tv_sales'
             
             # Get sale details including product_id
-            cursor.execute(f"SELECT product_id FROM {table} WHERE id = %s", (sale_id,))
+            cursor.execute(f"""
+                SELECT s.product_id, t.serial_number, t.brand, t.size
+                FROM {table} s
+                JOIN tv_inventory t ON s.product_id = t.id
+                WHERE s.id = %s
+            """, (sale_id,))
             sale = cursor.fetchone()
             
             if not sale:
@@ -871,8 +1028,18 @@ def delete_sale():
                 WHERE id = %s
             """, (sale['product_id'],))
             
-            # Delete the sale record
+            inventory_changes.record_added(cursor, sale['serial_number'])
+
+            # Delete the sale record; the shared rollup row last
+            sales_rollup.remove_sales(cursor, sale_type, [sale_id])
             cursor.execute(f"DELETE FROM {table} WHERE id = %s", (sale_id,))
+            restored_tv = {
+                "id": sale['product_id'],
+                "serial_number": sale['serial_number'],
+                "brand": sale['brand'],
+                "size": sale['size'],
+                "status": "available"
+            }
 
         elif sale_type == 'b2c_accessory':
             # Get accessory sale details
@@ -886,25 +1053,22 @@ def delete_sale():
             if not sale:
                 return "Sale not found", 404
 
-            # Determine which stock location to update based on labour_name
-            if sale['labour_name'] == 'prabhu':  # Prabhu
-                stock_column = 'prabhu_stock'
-            elif sale['labour_name'] == 'tamil':  # Tamil
-                stock_column = 'tamil_stock'
-            else:  # Main stock
-                stock_column = 'main_stock'
-
-            # Update the appropriate stock location
-            cursor.execute(f"""
-                UPDATE accessory_stock 
-                SET {stock_column} = {stock_column} + %s 
-                WHERE item_name = %s
-            """, (sale['quantity'], sale['item_name']))
+            # Return the quantity to the location it was sold from; sales
+            # recorded against names that aren't locations go back to main
+            location = sale['labour_name']
+            if not location or not stock.location_exists(cursor, location):
+                location = stock.DEFAULT_LOCATION
+            stock.add(cursor, sale['item_name'], location, sale['quantity'], "sale_deleted", int(sale_id))
             
-            # Delete the sale record
+            # Delete the sale record; the shared rollup row last
+            sales_rollup.remove_sales(cursor, sale_type, [sale_id])
             cursor.execute("DELETE FROM b2c_accessory_sales WHERE id = %s", (sale_id,))
 
         conn.commit()
+        dashboard_stats.invalidate()
+        stock_ledger.maybe_snapshot()
+        if restored_tv is not None:
+            serial_index.put(restored_tv)
         return redirect(url_for('sales_history'))
 
     except Exception as e:
@@ -917,23 +1081,265 @@ def delete_sale():
 
 @app.route("/search_items")
 def search_items():
-    query = request.args.get("query", "").strip().lower()
+    query = request.args.get("query", "").strip()
+    return jsonify({"results": item_index.search(query)})
+
+
+# Accessory Stock As Of A Past Date (nearest snapshot + ledger tail)
+@app.route("/stock_as_of")
+def stock_as_of():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    as_of = format_date(request.args.get("date", ""))
+    if not as_of:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    item_name = request.args.get("item", "").strip() or None
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        quantities = stock_ledger.stock_as_of(cursor, f"{as_of} 23:59:59", item_name)
+    finally:
+        conn.close()
+
+    if quantities is None:
+        return jsonify({"error": "No stock snapshot exists on or before that date"}), 404
+
+    return jsonify({
+        "date": as_of,
+        "stock": [
+            {"item_name": item, "location": location, "qty": qty}
+            for (item, location), qty in sorted(quantities.items())
+        ]
+    })
+
+
+# Stock Alerts Feed (low stock per item/location, aged TVs)
+def iso_dates(rows):
+    return [
+        {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+        for row in rows
+    ]
+
+@app.route("/stock_alerts")
+def get_stock_alerts():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    try:
+        after_id = int(request.args.get("after_id", 0))
+    except ValueError:
+        return jsonify({"error": "after_id must be an integer"}), 400
+
+    stock_alerts.maybe_check_aged()
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    try:
+        events = stock_alerts.events(cursor, after_id)
+        low_stock, aged_tvs, aged_total = stock_alerts.open_alerts(cursor)
+    finally:
+        conn.close()
+
+    return jsonify({
+        "events": iso_dates(events),
+        "next_after_id": events[-1]["id"] if events else after_id,
+        "low_stock": iso_dates(low_stock),
+        "aged_tvs": iso_dates(aged_tvs),
+        "aged_tv_total": aged_total,
+        "aged_tv_days": stock_alerts.AGED_TV_DAYS,
+    })
+
+@app.route("/stock_thresholds", methods=["POST"])
+def set_stock_threshold():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
 
+    item_name = request.form.get("item_name", "").strip()
+    location = request.form.get("location", "").strip()
+    min_qty = request.form.get("min_qty", "").strip()
+    if not item_name or not location:
+        return jsonify({"error": "item_name and location are required"}), 400
     try:
-        cursor.execute("""
-            SELECT item_name FROM accessory_stock 
-            WHERE LOWER(item_name) LIKE %s
-            ORDER BY item_name ASC
-            LIMIT 10
-        """, (f"%{query}%",))
-        results = [row["item_name"] for row in cursor.fetchall()]
-        return jsonify({"results": results})
+        # An empty min_qty falls back to the default threshold
+        min_qty = int(min_qty) if min_qty else None
+    except ValueError:
+        return jsonify({"error": "min_qty must be an integer"}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if not stock.location_exists(cursor, location):
+            return jsonify({"error": f"Unknown location {location}"}), 400
+        stock_alerts.set_threshold(cursor, item_name, location, min_qty)
+        conn.commit()
+        return jsonify({
+            "item_name": item_name,
+            "location": location,
+            "min_qty": min_qty if min_qty is not None else stock_alerts.DEFAULT_THRESHOLD,
+        })
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"error": f"Error saving threshold: {str(e)}"}), 500
     finally:
         conn.close()
 
 
+# Sales Report (daily rollup only)
+@app.route("/sales_report")
+def sales_report():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    start = format_date(request.args.get("start", ""))
+    end = format_date(request.args.get("end", ""))
+    if not start or not end:
+        return jsonify({"error": "start and end must be YYYY-MM-DD"}), 400
+
+    group_param = request.args.get("group")
+    group_by = tuple(g.strip() for g in group_param.split(",") if g.strip()) if group_param else sales_rollup.DEFAULT_GROUP
+    unknown = [g for g in group_by if g not in sales_rollup.GROUP_COLUMNS]
+    if unknown:
+        return jsonify({"error": f"Unknown group: {', '.join(unknown)}"}), 400
+
+    sale_type = request.args.get("type") or None
+    if sale_type and sale_type not in sales_rollup.SALE_TYPES:
+        return jsonify({"error": "type must be b2c_tv, b2b_tv or b2c_accessory"}), 400
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        rows = sales_rollup.report(cursor, start, end, group_by, sale_type)
+    finally:
+        conn.close()
+
+    return jsonify({
+        "start": start,
+        "end": end,
+        "group": list(group_by),
+        "rows": rows,
+        "total_units": sum(row["units"] for row in rows),
+        "total_revenue": round(sum(row["revenue"] for row in rows), 2),
+    })
+
+
+# Sales Analytics (pandas, cached per date range)
+ANALYTICS_DEFAULT_DAYS = 30
+
+def analytics_range():
+    # start/end query args, defaulting to the ANALYTICS_DEFAULT_DAYS ending today
+    end = format_date(request.args.get("end", "")) or datetime.now().strftime("%Y-%m-%d")
+    end = datetime.strptime(end, "%Y-%m-%d").date()
+    start = format_date(request.args.get("start", ""))
+    start = datetime.strptime(start, "%Y-%m-%d").date() if start else end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    return start, end
+
+@app.route("/analytics/revenue")
+def analytics_revenue():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    start, end = analytics_range()
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+    return jsonify(analytics.revenue_comparison(start, end))
+
+@app.route("/analytics/sell_through")
+def analytics_sell_through():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    start, end = analytics_range()
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+    return jsonify(analytics.sell_through(start, end))
+
+@app.route("/analytics/stock_ageing")
+def analytics_stock_ageing():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    as_of = format_date(request.args.get("as_of", ""))
+    as_of = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else None
+    return jsonify(analytics.stock_ageing(as_of))
+
+
+# TV Sale Lock Timings
+@app.route("/tv_sale_lock_stats")
+def get_tv_sale_lock_stats():
+    if "user" not in session:
+        return redirect(url_for("login"))
+    return jsonify({"default_mode": tv_sales.DEFAULT_LOCK_MODE, "modes": tv_sales.lock_stats()})
+
+
+# Request profiles
+@app.route("/profiles")
+def list_profiles():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify({"profiles": request_profiler.recent()})
+
+@app.route("/profiles/<profile_id>")
+def get_profile(profile_id):
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    summary = request_profiler.load(profile_id)
+    if summary is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify(summary)
+
+@app.route("/profiles/<profile_id>/download")
+def download_profile(profile_id):
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    path = request_profiler.prof_path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                     download_name=f"{profile_id}.prof")
+
+
+# Prometheus-style metrics. Needs a login, or IMS_METRICS_TOKEN as a bearer
+# token for scrapers.
+METRICS_TOKEN = os.environ.get("IMS_METRICS_TOKEN")
+
+@app.route("/metrics")
+def metrics():
+    authorized = "user" in session or (
+        METRICS_TOKEN and request.headers.get("Authorization") == f"Bearer {METRICS_TOKEN}"
+    )
+    if not authorized:
+        return "Unauthorized", 401
+    return Response(db_metrics.render(pool_stats()), mimetype="text/plain; version=0.0.4")
+
+
+# Connection Pool Stats
+@app.route("/pool_stats")
+def get_pool_stats():
+    if "user" not in session:
+        return redirect(url_for("login"))
+    return jsonify(pool_stats())
+
+
+# Active sessions per user, and revoking a user's sessions
+@app.route("/sessions")
+def list_sessions():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    counts = session_store.store.counts()
+    return jsonify({
+        "total": sum(counts.values()),
+        "users": {user or "": count for user, count in counts.items()},
+        "shared": bool(session_store.store.path),
+    })
+
+@app.route("/sessions/revoke", methods=["POST"])
+def revoke_sessions():
+    if "user" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    username = request.form.get("username", "").strip()
+    if not username:
+        return jsonify({"error": "username is required"}), 400
+    return jsonify({"username": username, "revoked": session_store.store.revoke_user(username)})
+
+
 # Logout Route
 @app.route("/logout")
 def logout():
@@ -0,0 +1,134 @@
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import secrets
+
+from db_config import get_connection
+
+# Salted password hashes for admin_login. Passwords are stored as
+#
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#
+# with a random salt per password. Rows still holding a plaintext password
+# (created by hand, or before migration 10 hashed them) are accepted once and
+# rehashed on that login, as are hashes made with fewer than ITERATIONS.
+#
+# Set a password from the shell with:
+#
+#   python auth.py set-password USERNAME
+
+ALGORITHM = "pbkdf2_sha256"
+ITERATIONS = int(os.environ.get("IMS_PASSWORD_ITERATIONS", 260000))
+SALT_BYTES = 16
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations)
+
+
+def hash_password(password, iterations=None):
+    iterations = iterations or ITERATIONS
+    salt = _b64(secrets.token_bytes(SALT_BYTES))
+    return f"{ALGORITHM}${iterations}${salt}${_b64(_pbkdf2(password, salt, iterations))}"
+
+
+def is_hashed(stored):
+    return stored.startswith(ALGORITHM + "$")
+
+
+def verify_password(password, stored):
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, iterations, salt, expected = stored.split("$")
+        iterations = int(iterations)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_b64(_pbkdf2(password, salt, iterations)), expected)
+
+
+def needs_rehash(stored):
+    return not is_hashed(stored) or int(stored.split("$")[1]) < ITERATIONS
+
+
+# Stands in for a missing user so unknown logins cost the same as wrong passwords
+_DUMMY_HASH = hash_password(secrets.token_hex(8))
+
+
+def find_users(cursor, login):
+    # One branch per column so each uses its own index
+    # (idx_admin_login_username / idx_admin_login_phone)
+    cursor.execute("""
+        SELECT id, username, password FROM admin_login WHERE username = %s
+        UNION
+        SELECT id, username, password FROM admin_login WHERE phone_no = %s
+    """, (login, login))
+    return cursor.fetchall()
+
+
+def authenticate(cursor, login, password):
+    # Returns the matching admin_login row (id, username, password) or None.
+    # Upgrades the stored hash if needed; the caller commits.
+    if not login or not password:
+        return None
+    for user in find_users(cursor, login):
+        stored = user["password"] if isinstance(user, dict) else user[2]
+        if verify_password(password, stored):
+            if needs_rehash(stored):
+                user_id = user["id"] if isinstance(user, dict) else user[0]
+                cursor.execute(
+                    "UPDATE admin_login SET password = %s WHERE id = %s", (hash_password(password), user_id)
+                )
+            return user
+    verify_password(password, _DUMMY_HASH)
+    return None
+
+
+def hash_existing_with(cursor):
+    # Migration step: hashes every plaintext password in place
+    cursor.execute("SELECT id, password FROM admin_login")
+    rows = [(user_id, stored) for user_id, stored in cursor.fetchall() if not is_hashed(stored)]
+    if rows:
+        cursor.executemany(
+            "UPDATE admin_login SET password = %s WHERE id = %s",
+            [(hash_password(stored), user_id) for user_id, stored in rows]
+        )
+
+
+def set_password(username, password):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE admin_login SET password = %s WHERE username = %s", (hash_password(password), username)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage admin_login passwords")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("set-password", help="set a user's password (prompts for it)")
+    command.add_argument("username")
+    args = parser.parse_args()
+
+    password = getpass.getpass("New password: ")
+    if password != getpass.getpass("Repeat: "):
+        parser.exit(1, "Passwords don't match\n")
+    if not set_password(args.username, password):
+        parser.exit(1, f"No user named {args.username}\n")
+    print(f"Password updated for {args.username}")
+
+
+if __name__ == "__main__":
+    main()
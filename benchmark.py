@@ -0,0 +1,322 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Latency benchmark for the hot routes, driven through the Flask test client
+# (no HTTP server, so the numbers are the app and database alone). For each
+# scenario it reports p50/p95/p99 latency, queries per request and the peak
+# Python memory of a few extra requests, and writes everything to JSON so
+# runs at different scales or commits can be compared:
+#
+#   python benchmark.py --sqlite /tmp/bench.sqlite3 --seed-tvs 100000 --output 100k.json
+#   python benchmark.py --sqlite /tmp/bench.sqlite3 --compare 100k.json
+#
+# Without --sqlite it uses whatever IMS_DB_BACKEND / IMS_DB_* point at. The
+# database should hold seed_data.py output; the sale scenarios sell some of
+# its available units.
+
+DEFAULT_REQUESTS = 200
+WARMUP = 3
+MEMORY_SAMPLES = 5
+# Exports read every sale, so they get a fraction of the request count
+EXPORT_REQUEST_SHARE = 20
+REGRESSION_THRESHOLD = 0.2
+
+
+class QueryCounter:
+    # Wraps the pool's connection factory so every cursor counts the
+    # statements it executes
+    def __init__(self):
+        self.queries = 0
+
+    def install(self, pool):
+        factory = pool.factory
+        pool.factory = lambda: _CountingConnection(factory(), self)
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, raw, counter):
+        self._raw = raw
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._raw.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _table_counts(get_connection):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        counts = {}
+        for table in ("tv_inventory", "b2c_tv_sales", "b2b_tv_sales", "b2c_accessory_sales"):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        return counts
+    finally:
+        conn.close()
+
+
+def _available_serials(get_connection, limit):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT serial_number FROM tv_inventory
+            WHERE status = 'available'
+            ORDER BY id DESC
+            LIMIT %s
+        """, (limit,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def scenarios(requests, serials, dashboard_stats):
+    # name -> (request count, before-each hook, function returning test
+    # client call kwargs)
+    exports = max(1, requests // EXPORT_REQUEST_SHARE)
+    sale_form = {"name": "Bench Customer", "phone": "9000000000", "price": "25000",
+                 "date": datetime.now().strftime("%Y-%m-%d"), "warranty": "1 year"}
+
+    def sale(mode):
+        def build():
+            return {"method": "POST", "path": "/submit_b2c_tv_sale",
+                    "data": dict(sale_form, serial=serials.pop(), lock_mode=mode)}
+        return build
+
+    def get(path, headers=None):
+        return lambda: {"method": "GET", "path": path, "headers": headers or {}}
+
+    return {
+        "dashboard": (requests, None, get("/dashboard")),
+        "dashboard_cold": (requests, dashboard_stats.invalidate, get("/dashboard")),
+        "available_tvs": (requests, None, get("/available_tvs")),
+        "sales_history": (requests, None, get("/sales_history")),
+        "sales_history_search": (requests, None, get("/sales_history?search=Kumar")),
+        "export_tv_sales_xlsx": (exports, None, get("/export_tv_sales")),
+        "export_tv_sales_csv": (exports, None, get("/export_tv_sales?format=csv")),
+        "get_available_serials": (requests, None, get("/get_available_serials")),
+        "get_available_serials_304": (requests, None, get("/get_available_serials", "etag")),
+        "submit_b2c_tv_sale_optimistic": (requests, None, sale("optimistic")),
+        "submit_b2c_tv_sale_pessimistic": (requests, None, sale("pessimistic")),
+    }
+
+
+def run_scenario(client, counter, count, before, build, etag):
+    latencies, queries, statuses = [], [], {}
+    for i in range(WARMUP + count):
+        if before:
+            before()
+        kwargs = build()
+        if kwargs.get("headers") == "etag":
+            kwargs["headers"] = {"If-None-Match": f'"{etag}"'}
+        counter.queries = 0
+        started = time.perf_counter()
+        response = client.open(**kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        response.close()
+        if i < WARMUP:
+            continue
+        latencies.append(elapsed * 1000)
+        queries.append(counter.queries)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    latencies.sort()
+    return {
+        "requests": count,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2),
+        "status_codes": statuses,
+    }
+
+
+def measure_memory(client, before, build, etag):
+    # Peak traced allocation over MEMORY_SAMPLES requests, above what was
+    # allocated before them. Run separately because tracing slows requests.
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(MEMORY_SAMPLES):
+            if before:
+                before()
+            kwargs = build()
+            if kwargs.get("headers") == "etag":
+                kwargs["headers"] = {"If-None-Match": f'"{etag}"'}
+            response = client.open(**kwargs)
+            response.get_data()
+            response.close()
+        return round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline_path, threshold):
+    # Prints p50/p95 changes against a saved run; returns the scenarios whose
+    # p95 got slower by more than threshold
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        p50 = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0
+        p95 = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        print(f"{name:34} p50 {before['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({p50:+.0%})  "
+              f"p95 {before['p95_ms']:9.2f} -> {result['p95_ms']:9.2f} ms ({p95:+.0%})")
+        if p95 > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot routes through the Flask test client")
+    parser.add_argument("--sqlite", help="run against this SQLite file (or :memory:) instead of IMS_DB_*")
+    parser.add_argument("--seed-tvs", type=int, help="migrate and seed this many TVs first (empty database)")
+    parser.add_argument("--seed", type=int, default=42, help="seed for --seed-tvs")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="requests per scenario")
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="p95 slowdown (fraction) that counts as a regression")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ["IMS_DB_BACKEND"] = "sqlite"
+        os.environ["IMS_SQLITE_PATH"] = args.sqlite
+
+    # Imported here so --sqlite takes effect before db_config reads the
+    # environment, and the counter wraps connections before the app opens any
+    import db_config
+    counter = QueryCounter()
+    counter.install(db_config.pool)
+
+    if args.seed_tvs:
+        import migrations
+        import seed_data
+        migrations.migrate()
+        seed_data.generate(tvs=args.seed_tvs, seed=args.seed)
+
+    import dashboard_stats
+    from app import app
+
+    selected = scenarios(0, [], dashboard_stats)
+    names = args.only.split(",") if args.only else list(selected)
+    unknown = [name for name in names if name not in selected]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(selected)})")
+
+    sales_needed = sum(WARMUP + args.requests + MEMORY_SAMPLES for name in names if name.startswith("submit_"))
+    serials = _available_serials(db_config.get_connection, sales_needed)
+    if len(serials) < sales_needed:
+        sys.exit(f"Need {sales_needed} available TVs for the sale scenarios, found {len(serials)}")
+    selected = scenarios(args.requests, serials, dashboard_stats)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "benchmark"
+
+    counts = _table_counts(db_config.get_connection)
+
+    results = {}
+    for name in names:
+        count, before, build = selected[name]
+        # The sale scenarios move the serials version on, so take it fresh
+        etag = client.get("/get_available_serials").headers.get("ETag", "").strip('"')
+        result = run_scenario(client, counter, count, before, build, etag)
+        if not args.no_memory:
+            result["peak_memory_kb"] = measure_memory(client, before, build, etag)
+        results[name] = result
+        print(f"{name:34} p50 {result['p50_ms']:9.2f}  p95 {result['p95_ms']:9.2f}  "
+              f"p99 {result['p99_ms']:9.2f} ms  {result['queries_per_request']:6.1f} queries"
+              + (f"  {result['peak_memory_kb']:10.1f} KiB" if "peak_memory_kb" in result else ""))
+
+    # How long each sale mode kept the unit's row and the rollup row locked
+    import tv_sales
+    locks = tv_sales.lock_stats()
+    for mode, stats in locks.items():
+        if stats["sales"]:
+            print(f"tv sale {mode:12} unit held avg {stats['avg_held_ms']:8.3f}  max {stats['max_held_ms']:8.3f} ms  "
+                  f"rollup held avg {stats['avg_rollup_held_ms']:8.3f}  max {stats['max_rollup_held_ms']:8.3f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "backend": db_config.DB_BACKEND,
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests_per_scenario": args.requests,
+            "rows": counts,
+        },
+        "scenarios": results,
+        "tv_sale_locks": locks,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(f"p95 regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from db_config import DIALECT, get_connection
+
+# Upper bound on how stale the snapshot can get when another worker process
+# writes to the database (in-process invalidation only covers this worker).
+SNAPSHOT_TTL = 30
+
+# The brand and location lists arrive as newline-joined strings. SQLite's
+# group_concat has no ORDER BY or SEPARATOR clause and keeps the order of an
+# ordered subquery instead.
+if DIALECT == "sqlite":
+    BRANDS_SQL = """(SELECT group_concat(brand, char(10)) FROM (
+                SELECT DISTINCT brand FROM tv_inventory WHERE status = 'available' ORDER BY brand))"""
+    LOCATIONS_SQL = """(SELECT group_concat(name || char(9) || label, char(10)) FROM (
+                SELECT name, label FROM stock_locations ORDER BY sort_order, name))"""
+else:
+    BRANDS_SQL = """(SELECT GROUP_CONCAT(DISTINCT brand ORDER BY brand ASC SEPARATOR '\\n')
+               FROM tv_inventory WHERE status = 'available')"""
+    LOCATIONS_SQL = """(SELECT GROUP_CONCAT(CONCAT(name, '\\t', label) ORDER BY sort_order, name SEPARATOR '\\n')
+               FROM stock_locations)"""
+
+# All dashboard counters in a single round trip. The counters come from scalar
+# subqueries in a one-row derived table, and the per-location accessory stock
+# is LEFT JOINed onto it so those rows arrive in the same result set.
+STATS_QUERY = f"""
+    SELECT
+        c.total_stock,
+        c.available_count,
+        c.b2c_sales,
+        c.b2b_sales,
+        c.tv_brands,
+        c.locations,
+        a.item_name,
+        ls.location,
+        ls.qty
+    FROM (
+        SELECT
+            (SELECT COUNT(*) FROM tv_inventory) AS total_stock,
+            (SELECT COUNT(*) FROM tv_inventory WHERE status = 'available') AS available_count,
+            (SELECT COUNT(*) FROM b2c_tv_sales) AS b2c_sales,
+            (SELECT COUNT(*) FROM b2b_tv_sales) AS b2b_sales,
+            {BRANDS_SQL} AS tv_brands,
+            {LOCATIONS_SQL} AS locations
+    ) c
+    LEFT JOIN accessory_stock a ON 1 = 1
+    LEFT JOIN accessory_location_stock ls ON ls.item_name = a.item_name
+    ORDER BY a.item_name
+"""
+
+_lock = threading.Lock()
+_snapshot = None
+_loaded_at = 0.0
+_generation = 0
+
+
+def load_stats(cursor):
+    cursor.execute(STATS_QUERY)
+    rows = cursor.fetchall()
+    first = rows[0]
+
+    locations = [
+        {"name": name, "label": label, "total": 0}
+        for name, label in (
+            line.split("\t", 1) for line in (first["locations"] or "").split("\n") if line
+        )
+    ]
+    totals = {location["name"]: location for location in locations}
+
+    items = {}
+    for row in rows:
+        if row["item_name"] is None:
+            continue
+        item = items.setdefault(row["item_name"], {
+            "item_name": row["item_name"],
+            "stock": dict.fromkeys(totals, 0),
+            "total": 0,
+        })
+        if row["location"] in totals:
+            qty = row["qty"] or 0
+            item["stock"][row["location"]] = qty
+            item["total"] += qty
+            totals[row["location"]]["total"] += qty
+
+    return {
+        "tv_brands": first["tv_brands"].split("\n") if first["tv_brands"] else [],
+        "total_stock": first["total_stock"],
+        "available_count": first["available_count"],
+        "b2c_sales": first["b2c_sales"],
+        "b2b_sales": first["b2b_sales"],
+        "total_accessories": sum(location["total"] for location in locations),
+        "locations": locations,
+        "accessory_items": list(items.values()),
+    }
+
+
+def get_stats():
+    global _snapshot, _loaded_at
+
+    with _lock:
+        if _snapshot is not None and time.monotonic() - _loaded_at < SNAPSHOT_TTL:
+            return _snapshot
+        generation = _generation
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        stats = load_stats(cursor)
+    finally:
+        conn.close()
+
+    with _lock:
+        # Don't publish a snapshot that a concurrent write has already outdated
+        if generation == _generation:
+            _snapshot = stats
+            _loaded_at = time.monotonic()
+    return stats
+
+
+def invalidate():
+    # Called by write routes after they commit
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
@@ -1,9 +1,222 @@
-import mysql.connector
+import os
+import threading
+import time
+from collections import deque
+
+import db_metrics
+
+# "mysql" (default) or "sqlite" (see db_sqlite.py). DIALECT is checked by the
+# few queries that can't be translated mechanically.
+DB_BACKEND = os.environ.get("IMS_DB_BACKEND", "mysql")
+DIALECT = DB_BACKEND
+
+DB_HOST = os.environ.get("IMS_DB_HOST", "localhost")
+DB_USER = os.environ.get("IMS_DB_USER", "root")
+DB_PASSWORD = os.environ.get("IMS_DB_PASSWORD", "")
+DB_NAME = os.environ.get("IMS_DB_NAME", "ims")
+
+# Pool settings
+POOL_SIZE = int(os.environ.get("IMS_DB_POOL_SIZE", 10))
+POOL_TIMEOUT = float(os.environ.get("IMS_DB_POOL_TIMEOUT", 5))
+# Connections idle for longer than this are pinged before being handed out
+POOL_PING_AFTER = float(os.environ.get("IMS_DB_POOL_PING_AFTER", 30))
+# Connections older than this are closed and replaced on checkout
+POOL_RECYCLE = float(os.environ.get("IMS_DB_POOL_RECYCLE", 3600))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect():
+    import mysql.connector
 
-def get_connection():
     return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",         
-        database="ims"       
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME
     )
+
+
+class PooledConnection:
+    # Thin proxy around a raw connection. close() hands the connection back
+    # to the pool instead of closing the socket, so call sites stay unchanged.
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        # Cursors are timed per request (see db_metrics)
+        return db_metrics.instrument(self._raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        db_metrics.timed("COMMIT", self._raw.commit)
+
+    def rollback(self):
+        db_metrics.timed("ROLLBACK", self._raw.rollback)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 ping_after=POOL_PING_AFTER, recycle=POOL_RECYCLE):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.recycle = recycle
+
+        self._idle = deque()  # (raw, created_at, released_at)
+        self._cond = threading.Condition()
+        self._open = 0
+
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.recycled = 0
+
+    def get(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, released_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool size {self.size})"
+                    )
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+
+        try:
+            if raw is not None:
+                raw, created_at = self._check(raw, created_at, released_at)
+            else:
+                raw, created_at = self._new()
+        except Exception:
+            with self._cond:
+                self.in_use -= 1
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _new(self):
+        raw = self.factory()
+        with self._cond:
+            self.created += 1
+        return raw, time.monotonic()
+
+    def _check(self, raw, created_at, released_at):
+        now = time.monotonic()
+        if now - created_at > self.recycle:
+            self._discard(raw)
+            with self._cond:
+                self.recycled += 1
+            return self._new()
+        if now - released_at > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._discard(raw)
+                with self._cond:
+                    self.recycled += 1
+                return self._new()
+        return raw, created_at
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        # Never hand out a connection with a half-finished transaction
+        healthy = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self.in_use -= 1
+            if healthy:
+                self._idle.append((raw, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+                self.recycled += 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "created": self.created,
+                "recycled": self.recycled,
+            }
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+
+def _factory():
+    if DB_BACKEND == "sqlite":
+        import db_sqlite
+        return db_sqlite.connect
+    if DB_BACKEND != "mysql":
+        raise ValueError(f"Unknown IMS_DB_BACKEND {DB_BACKEND!r} (expected mysql or sqlite)")
+    return _connect
+
+
+pool = ConnectionPool(_factory())
+
+
+def get_connection():
+    return pool.get()
+
+
+def pool_stats():
+    return pool.stats()
@@ -0,0 +1,224 @@
+import logging
+import os
+import re
+import threading
+import time
+
+# Per-request database instrumentation. db_config wraps every cursor in
+# TimedCursor, which adds each statement's time and fetched rows to the
+# current request's RequestStats (a thread-local set up by app.py around
+# each request). Statements slower than SLOW_QUERY_MS are logged with their
+# SQL wherever they run. Finished requests feed per-route histograms that
+# /metrics renders in the Prometheus text format.
+#
+# Time spent streaming a response body after the view returns (the CSV
+# exports) is logged as slow statements but isn't in the request's totals.
+
+ENABLED = os.environ.get("IMS_DB_METRICS", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("IMS_SLOW_QUERY_MS", 100))
+# SQL text kept per slow statement
+SLOW_SQL_CHARS = 500
+
+DURATION_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250]
+
+logger = logging.getLogger("ims.db")
+
+_local = threading.local()
+_lock = threading.Lock()
+_routes = {}  # route -> RouteMetrics
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestStats:
+    __slots__ = ("route", "queries", "db_time", "rows", "slow")
+
+    def __init__(self, route):
+        self.route = route
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.slow = []
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.db_time_ms = Histogram(DURATION_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.rows = 0
+        self.slow_queries = 0
+        self.statuses = {}
+
+
+def current():
+    return getattr(_local, "stats", None)
+
+
+def start_request(route):
+    _local.stats = RequestStats(route)
+
+
+def finish_request(status, duration):
+    # Ends the current request and records it; returns its RequestStats
+    stats = current()
+    _local.stats = None
+    if stats is None:
+        return None
+    with _lock:
+        metrics = _routes.get(stats.route)
+        if metrics is None:
+            metrics = _routes[stats.route] = RouteMetrics()
+        metrics.duration_ms.observe(duration * 1000)
+        metrics.db_time_ms.observe(stats.db_time * 1000)
+        metrics.queries.observe(stats.queries)
+        metrics.rows += stats.rows
+        metrics.slow_queries += len(stats.slow)
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+    return stats
+
+
+def _record(sql, elapsed, rows=0, statement=True):
+    stats = current()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.rows += rows
+        if statement:
+            stats.queries += 1
+    if statement and elapsed * 1000 >= SLOW_QUERY_MS:
+        text = _WHITESPACE.sub(" ", str(sql)).strip()[:SLOW_SQL_CHARS]
+        route = stats.route if stats is not None else None
+        if stats is not None:
+            stats.slow.append({"ms": round(elapsed * 1000, 3), "sql": text})
+        logger.warning("Slow query (%.1f ms, route %s): %s", elapsed * 1000, route, text)
+
+
+def timed(label, fn, *args):
+    # Times a non-cursor database call such as commit()
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        _record(label, time.perf_counter() - started)
+
+
+class TimedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            _record(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _record(operation, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        _record(None, time.perf_counter() - started, 1 if row is not None else 0, statement=False)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        _record(None, time.perf_counter() - started, len(rows), statement=False)
+        return rows
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        _record(None, time.perf_counter() - started, len(rows), statement=False)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            _record(None, 0.0, 1, statement=False)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def instrument(cursor):
+    return TimedCursor(cursor) if ENABLED else cursor
+
+
+def server_timing(stats, duration):
+    return (
+        f'db;dur={stats.db_time * 1000:.3f};desc="{stats.queries} queries, {stats.rows} rows", '
+        f"total;dur={duration * 1000:.3f}"
+    )
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name, route, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(route=route, le=bound)} {cumulative}"
+    yield f"{name}_sum{_labels(route=route)} {histogram.sum:.3f}"
+    yield f"{name}_count{_labels(route=route)} {histogram.count}"
+
+
+def render(pool_stats=None):
+    # Prometheus text exposition of the per-route metrics
+    with _lock:
+        routes = sorted(_routes.items())
+        lines = []
+        for name, kind, attr in (
+            ("ims_request_duration_ms", "histogram", "duration_ms"),
+            ("ims_request_db_time_ms", "histogram", "db_time_ms"),
+            ("ims_request_queries", "histogram", "queries"),
+        ):
+            lines.append(f"# TYPE {name} {kind}")
+            for route, metrics in routes:
+                lines.extend(_histogram_lines(name, route, getattr(metrics, attr)))
+
+        lines.append("# TYPE ims_request_rows_total counter")
+        lines.extend(f"ims_request_rows_total{_labels(route=route)} {m.rows}" for route, m in routes)
+        lines.append("# TYPE ims_slow_queries_total counter")
+        lines.extend(f"ims_slow_queries_total{_labels(route=route)} {m.slow_queries}" for route, m in routes)
+        lines.append("# TYPE ims_requests_total counter")
+        for route, metrics in routes:
+            lines.extend(
+                f"ims_requests_total{_labels(route=route, status=status)} {count}"
+                for status, count in sorted(metrics.statuses.items())
+            )
+
+    if pool_stats:
+        for key, value in sorted(pool_stats.items()):
+            kind = "counter" if key in ("created", "recycled") else "gauge"
+            name = f"ims_db_pool_{key}_total" if kind == "counter" else f"ims_db_pool_{key}"
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
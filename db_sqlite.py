@@ -0,0 +1,293 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+# SQLite backend for db_config (IMS_DB_BACKEND=sqlite), so the app can run
+# against a local file or an in-memory database for load tests and CI perf
+# runs without a MySQL server.
+#
+# Connections and cursors mimic the parts of mysql.connector the app uses:
+# cursor(dictionary=True) rows, %s placeholders, lastrowid/rowcount, ping()
+# and in_transaction. translate() rewrites the MySQL statements this repo
+# issues into SQLite's dialect. The rewrites are pattern based and cover
+# this repo's SQL, not MySQL in general. Statements that can't be rewritten
+# mechanically (GROUP_CONCAT ... SEPARATOR, MATCH ... AGAINST,
+# information_schema) are branched on db_config.DIALECT where they are
+# built.
+#
+# Transactions: SQLite has one writer at a time, so row locks become a
+# database write lock. A transaction starts with BEGIN IMMEDIATE at the first
+# write or locking read (FOR UPDATE / LOCK IN SHARE MODE) and holds the
+# lock until commit. Plain reads outside a transaction run in autocommit.
+
+SQLITE_PATH = os.environ.get("IMS_SQLITE_PATH", "ims.sqlite3")
+BUSY_TIMEOUT = float(os.environ.get("IMS_SQLITE_BUSY_TIMEOUT", 10))
+
+# Named in-memory database shared by every connection in the process
+MEMORY_URI = "file:ims_memory?mode=memory&cache=shared"
+
+_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+_WRITE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+_LOCKING = re.compile(r"\s+(FOR UPDATE|LOCK IN SHARE MODE)\b", re.I)
+
+_keeper = None
+_keeper_lock = threading.Lock()
+
+
+def _convert_timestamp(value):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _convert_date(value):
+    text = value.decode()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" ", "seconds"))
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATETIME", _convert_timestamp)
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()))
+
+
+def _concat(*args):
+    # MySQL CONCAT: NULL if any argument is NULL
+    if any(arg is None for arg in args):
+        return None
+    return "".join(str(arg) for arg in args)
+
+
+def _value(value):
+    # Expressions have no declared type, so SQLite hands timestamps back as
+    # text where MySQL returns datetimes
+    if isinstance(value, str) and _TIMESTAMP.match(value):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _tuple_row(cursor, row):
+    return tuple(_value(v) for v in row)
+
+
+def _dict_row(cursor, row):
+    return {d[0]: _value(v) for d, v in zip(cursor.description, row)}
+
+
+# -- Statement translation ---------------------------------------------------
+
+_CREATE_TABLE = re.compile(r"^\s*CREATE TABLE IF NOT EXISTS (\w+)", re.I)
+_INLINE_KEY = re.compile(r",\s*(UNIQUE )?KEY (\w+) (\([^)]*\))", re.I)
+_AUTO_PK = re.compile(r"\b(?:BIG|TINY)?INT NOT NULL AUTO_INCREMENT PRIMARY KEY", re.I)
+_ENUM = re.compile(r"\bENUM\([^)]*\)", re.I)
+_ALTER_INDEX = re.compile(r"^\s*ALTER TABLE (\w+) ADD (UNIQUE |FULLTEXT )?INDEX (\w+) (\(.*\))\s*$", re.I | re.S)
+_ALTER_MODIFY = re.compile(r"^\s*ALTER TABLE \w+ MODIFY\b", re.I)
+_MODIFY_DEFAULT_NOW = re.compile(
+    r"^\s*ALTER TABLE (\w+) MODIFY (\w+) \w+ NULL DEFAULT CURRENT_TIMESTAMP\s*$", re.I
+)
+_INTERVAL = re.compile(r"CURRENT_TIMESTAMP - INTERVAL (%s|\d+) (DAY|SECOND)", re.I)
+_TIMESTAMPDIFF = re.compile(r"TIMESTAMPDIFF\((SECOND|DAY),\s*(.+?),\s*(CURRENT_TIMESTAMP|[\w.]+)\)", re.I)
+_ROW_IN = re.compile(r"\bIN \((\(%s, %s\)(?:, \(%s, %s\))*)\)", re.I)
+_ON_DUPLICATE = re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.I)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.I)
+
+
+def _interval(match):
+    amount, unit = match.groups()
+    return f"datetime(CURRENT_TIMESTAMP, '-' || {amount} || ' {unit.lower()}s')"
+
+
+def _timestampdiff(match):
+    unit, start, end = match.groups()
+    days = f"(julianday({end}) - julianday({start}))"
+    if unit.upper() == "SECOND":
+        return f"CAST({days} * 86400 AS INTEGER)"
+    return f"CAST({days} AS INTEGER)"
+
+
+def _create_table(sql, table):
+    indexes = [
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} {columns}"
+        for unique, name, columns in _INLINE_KEY.findall(sql)
+    ]
+    sql = _INLINE_KEY.sub("", sql)
+    sql = _AUTO_PK.sub("INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+    sql = _ENUM.sub("TEXT", sql)
+    return [sql] + indexes
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    # Returns (statements, locking): the SQLite statements for one MySQL
+    # statement (possibly none) and whether it was a locking read
+    table = _CREATE_TABLE.match(sql)
+    if table:
+        return tuple(_create_table(sql, table.group(1))), False
+
+    index = _ALTER_INDEX.match(sql)
+    if index:
+        table, kind, name, columns = index.groups()
+        if kind and kind.strip().upper() == "FULLTEXT":
+            # No FULLTEXT in SQLite; sales_search falls back to LIKE
+            return (), False
+        unique = "UNIQUE " if kind else ""
+        return (f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {table} {columns}",), False
+
+    column = _MODIFY_DEFAULT_NOW.match(sql)
+    if column:
+        # SQLite can't alter a column's default, and an added column can't
+        # default to CURRENT_TIMESTAMP; fill new rows in with a trigger
+        table, name = column.groups()
+        return (
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_{name}_default AFTER INSERT ON {table}
+                WHEN NEW.{name} IS NULL
+                BEGIN UPDATE {table} SET {name} = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid; END""",
+        ), False
+
+    if _ALTER_MODIFY.match(sql):
+        # Other column defaults only matter to MySQL's strict mode here
+        return (), False
+
+    locking = bool(_LOCKING.search(sql))
+    sql = _LOCKING.sub("", sql)
+    sql = re.sub(r"\bINSERT IGNORE\b", "INSERT OR IGNORE", sql, flags=re.I)
+
+    duplicate = _ON_DUPLICATE.search(sql)
+    if duplicate:
+        head, tail = sql[:duplicate.start()], sql[duplicate.end():]
+        sql = head + "ON CONFLICT DO UPDATE SET" + _VALUES_REF.sub(r"excluded.\1", tail)
+
+    sql = _INTERVAL.sub(_interval, sql)
+    sql = _TIMESTAMPDIFF.sub(_timestampdiff, sql)
+    # A row-value IN needs a subquery on the right in SQLite
+    sql = _ROW_IN.sub(r"IN (VALUES \1)", sql)
+    # MySQL's LIKE escapes with backslash by default; SQLite has no default
+    sql = re.sub(r"\bLIKE %s", r"LIKE %s ESCAPE '\\'", sql, flags=re.I)
+    sql = sql.replace("%s", "?")
+    return (sql,), locking
+
+
+# -- Connections --------------------------------------------------------------
+
+class Cursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn._raw.cursor()
+        self._cursor.row_factory = _dict_row if dictionary else _tuple_row
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def _prepare(self, sql):
+        statements, locking = translate(sql)
+        if (locking or (statements and _WRITE.match(statements[-1]))) and not self._conn._raw.in_transaction:
+            self._conn._raw.execute("BEGIN IMMEDIATE")
+        return statements
+
+    def execute(self, sql, params=None):
+        statements = self._prepare(sql)
+        for statement in statements:
+            self._cursor.execute(statement, tuple(params or ()) if statement is statements[-1] else ())
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        statements = self._prepare(sql)
+        if statements:
+            self._cursor.executemany(statements[-1], [tuple(p) for p in seq_of_params])
+        self.rowcount = self._cursor.rowcount
+        if statements and statements[-1].lstrip()[:6].upper() == "INSERT" and self.rowcount > 0:
+            # Like mysql.connector's multi-row INSERT: the first new id. The
+            # write lock keeps the batch's ids consecutive.
+            last = self._conn._raw.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.lastrowid = last - self.rowcount + 1
+        return self
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, dictionary=False, buffered=None):
+        # buffered is accepted for mysql.connector compatibility; SQLite
+        # cursors always step through rows on demand
+        return Cursor(self, dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False):
+        self._raw.execute("SELECT 1").fetchone()
+
+    def close(self):
+        self._raw.close()
+
+
+def _open(path):
+    memory = path == ":memory:"
+    raw = sqlite3.connect(
+        MEMORY_URI if memory else path,
+        uri=memory,
+        timeout=BUSY_TIMEOUT,
+        isolation_level=None,
+        check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+    )
+    raw.create_function("CONCAT", -1, _concat, deterministic=True)
+    raw.create_function("DATABASE", 0, lambda: "main")
+    raw.create_function("NOW", 0, lambda: datetime.now().isoformat(" ", "seconds"))
+    raw.execute("PRAGMA foreign_keys = ON")
+    if not memory:
+        raw.execute("PRAGMA journal_mode = WAL")
+    return raw
+
+
+def connect(path=None):
+    # Connection factory for db_config's pool
+    global _keeper
+    path = path or SQLITE_PATH
+    if path == ":memory:":
+        # A shared in-memory database lives as long as one connection to it
+        # is open; keep one for the life of the process
+        with _keeper_lock:
+            if _keeper is None:
+                _keeper = _open(path)
+    return Connection(_open(path))
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import exports
+
+# Background exports. Each job's state is kept as <id>.json next to its file
+# in ARTIFACT_DIR, and <key>.key points identical requests at the same job,
+# so any worker using the same directory can report on, download and reuse a
+# job another worker ran. The default directory is shared by the workers on
+# one host; with several hosts, point IMS_EXPORT_DIR at shared storage.
+#
+# A running job rewrites its state every SAVE_INTERVAL seconds. One whose
+# state hasn't changed for STALE_AFTER (its worker died, or it waited that
+# long in the queue) is reported as failed, so the next request starts over.
+
+MAX_WORKERS = int(os.environ.get("IMS_EXPORT_WORKERS", 2))
+# Finished files are reused for identical requests, then deleted
+ARTIFACT_TTL = int(os.environ.get("IMS_EXPORT_TTL", 15 * 60))
+ARTIFACT_DIR = os.environ.get("IMS_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "ims_exports"))
+SAVE_INTERVAL = 2
+STALE_AFTER = 30 * 60
+SWEEP_INTERVAL = 60
+
+KINDS = {
+    "tv": ("TV Sales", "tv_sales_export"),
+    "accessory": ("Accessory Sales", "accessory_sales_export"),
+}
+FORMATS = ("xlsx", "csv")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_STATE_FIELDS = (
+    "id", "key", "kind", "format", "filters", "status", "rows", "error", "path",
+    "created_at", "updated_at", "finished_at",
+)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="export")
+_lock = threading.Lock()
+_jobs = {}  # job id -> Job queued or running in this process
+_swept_at = 0.0
+
+
+class Job:
+    def __init__(self, key, kind, fmt, filters):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        self.format = fmt
+        self.filters = filters
+        self.status = "queued"
+        self.rows = 0
+        self.error = None
+        self.path = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls.__new__(cls)
+        for field in _STATE_FIELDS:
+            setattr(job, field, state[field])
+        return job
+
+    def state(self):
+        return {field: getattr(self, field) for field in _STATE_FIELDS}
+
+    @property
+    def filename(self):
+        return f"{KINDS[self.kind][1]}.{self.format}"
+
+    def expired(self, now):
+        return self.finished_at is not None and now - self.finished_at > ARTIFACT_TTL
+
+    def check_stale(self, now):
+        # For jobs loaded from another worker's state file
+        if self.finished_at is None and now - self.updated_at > STALE_AFTER:
+            self.status = "failed"
+            self.error = "Export stopped before finishing"
+            self.finished_at = self.updated_at
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "format": self.format,
+            "status": self.status,
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+def _key(kind, fmt, filters):
+    raw = json.dumps([kind, fmt, filters], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _query(kind, filters):
+    if kind == "tv":
+        return exports.tv_sales_query(
+            filters["search"], filters["size"], filters["start_date"],
+            filters["end_date"], filters["sort"], search_mode=filters["search_mode"]
+        )
+    return exports.accessory_sales_query(
+        filters["search"], filters["start_date"], filters["end_date"], filters["sort"],
+        search_mode=filters["search_mode"]
+    )
+
+
+def _state_path(job_id):
+    return os.path.join(ARTIFACT_DIR, f"{job_id}.json")
+
+
+def _key_path(key):
+    return os.path.join(ARTIFACT_DIR, f"{key}.key")
+
+
+def _write(path, text):
+    # Readers in other workers see the old or the new file, never half of one
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _save(job):
+    job.updated_at = time.time()
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    _write(_state_path(job.id), json.dumps(job.state()))
+
+
+def _load(job_id):
+    if not _JOB_ID.match(job_id):
+        return None
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    try:
+        with open(_state_path(job_id)) as f:
+            job = Job.from_state(json.load(f))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    job.check_stale(time.time())
+    return job
+
+
+def _counting(job, rows):
+    # Pass rows through, keeping job.rows current (the first row is the
+    # header) and the saved state no more than SAVE_INTERVAL behind
+    for i, row in enumerate(rows):
+        if i:
+            job.rows = i
+            if i % 1000 == 0 and time.time() - job.updated_at >= SAVE_INTERVAL:
+                _save(job)
+        yield row
+
+
+def _run(job):
+    job.status = "running"
+    _save(job)
+    query, params = _query(job.kind, job.filters)
+    path = os.path.join(ARTIFACT_DIR, f"{job.id}.{job.format}")
+    try:
+        # Reports the rows written so far rather than a percentage: counting
+        # the rows up front would run the export query twice
+        rows = _counting(job, exports.stream_rows(query, params))
+        with open(path, "wb") as output:
+            if job.format == "csv":
+                for chunk in exports.csv_chunks(rows):
+                    output.write(chunk)
+            else:
+                exports.write_xlsx(rows, KINDS[job.kind][0], output=output)
+        job.path = path
+        job.status = "done"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        _remove(path)
+    finally:
+        job.finished_at = time.time()
+        _save(job)
+        with _lock:
+            _jobs.pop(job.id, None)
+
+
+def _sweep(now):
+    # Drop expired jobs and their files, at most every SWEEP_INTERVAL;
+    # caller holds _lock. Other workers may be sweeping the same files.
+    global _swept_at
+    if now - _swept_at < SWEEP_INTERVAL:
+        return
+    _swept_at = now
+    try:
+        names = os.listdir(ARTIFACT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        job = _load(name[:-5]) if name.endswith(".json") else None
+        if job is None or not job.expired(now):
+            continue
+        if _key_target(job.key) == job.id:
+            _remove(_key_path(job.key))
+        _remove(_state_path(job.id))
+        if job.path:
+            _remove(job.path)
+
+
+def _key_target(key):
+    try:
+        with open(_key_path(key)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _find(key):
+    job_id = _key_target(key)
+    return _load(job_id) if job_id else None
+
+
+def submit(kind, fmt, filters):
+    # Identical requests share one job: while it runs, and for ARTIFACT_TTL
+    # after it finishes. Two workers taking the same new request at once may
+    # both run it; the later one wins the key.
+    key = _key(kind, fmt, filters)
+    now = time.time()
+    with _lock:
+        _sweep(now)
+        job = _find(key)
+        if job is not None and job.status != "failed" and not job.expired(now):
+            return job
+
+        job = Job(key, kind, fmt, filters)
+        _jobs[job.id] = job
+        _save(job)
+        _write(_key_path(key), job.id)
+
+    _executor.submit(_run, job)
+    return job
+
+
+def get(job_id):
+    with _lock:
+        _sweep(time.time())
+    job = _load(job_id)
+    if job is None or job.expired(time.time()):
+        return None
+    return job
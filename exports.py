@@ -0,0 +1,191 @@
+import csv
+import io
+import tempfile
+import zlib
+
+from openpyxl import Workbook
+
+from db_config import get_connection
+import sales_search
+
+# Rows pulled from the server per fetchmany() while streaming
+FETCH_BATCH = 1000
+
+
+def tv_sales_query(search, size_filter, start_date, end_date, sort_order, search_mode="indexed"):
+    tv_query = """
+    SELECT
+        'B2C' AS type,
+        b.customer_name AS name,
+        b.phone,
+        t.brand,
+        t.size,
+        t.serial_number,
+        b.sale_date,
+        b.warranty,
+        b.price
+    FROM b2c_tv_sales b
+    JOIN tv_inventory t ON b.product_id = t.id
+    WHERE 1=1
+    """
+    params = []
+
+    cond, cond_params = sales_search.search_condition(
+        search, ["b.customer_name"], "b.phone", "t.serial_number", mode=search_mode
+    )
+    tv_query += cond
+    params.extend(cond_params)
+
+    if size_filter:
+        tv_query += " AND t.size = %s"
+        params.append(size_filter)
+
+    if start_date:
+        tv_query += " AND b.sale_date >= %s"
+        params.append(start_date)
+
+    if end_date:
+        tv_query += " AND b.sale_date <= %s"
+        params.append(end_date)
+
+    tv_query += """
+    UNION ALL
+    SELECT
+        'B2B' AS type,
+        b.business_name AS name,
+        b.phone,
+        t.brand,
+        t.size,
+        t.serial_number,
+        b.sale_date,
+        b.warranty,
+        b.price
+    FROM b2b_tv_sales b
+    JOIN tv_inventory t ON b.product_id = t.id
+    WHERE 1=1
+    """
+
+    cond, cond_params = sales_search.search_condition(
+        search, ["b.business_name"], "b.phone", "t.serial_number", mode=search_mode
+    )
+    tv_query += cond
+    params.extend(cond_params)
+
+    if size_filter:
+        tv_query += " AND t.size = %s"
+        params.append(size_filter)
+
+    if start_date:
+        tv_query += " AND b.sale_date >= %s"
+        params.append(start_date)
+
+    if end_date:
+        tv_query += " AND b.sale_date <= %s"
+        params.append(end_date)
+
+    tv_query += f" ORDER BY sale_date {sort_order}"
+    return tv_query, tuple(params)
+
+
+def accessory_sales_query(search, start_date, end_date, sort_order, search_mode="indexed"):
+    accessory_query = """
+    SELECT
+        customer_name,
+        phone,
+        item_name,
+        quantity,
+        labour_name,
+        sale_date,
+        price
+    FROM b2c_accessory_sales
+    WHERE 1=1
+    """
+    params = []
+
+    cond, cond_params = sales_search.search_condition(
+        search, ["customer_name", "item_name"], "phone", mode=search_mode
+    )
+    accessory_query += cond
+    params.extend(cond_params)
+
+    if start_date:
+        accessory_query += " AND sale_date >= %s"
+        params.append(start_date)
+
+    if end_date:
+        accessory_query += " AND sale_date <= %s"
+        params.append(end_date)
+
+    accessory_query += f" ORDER BY sale_date {sort_order}"
+    return accessory_query, tuple(params)
+
+
+def stream_rows(query, params, batch_size=FETCH_BATCH):
+    # Yields the column names, then every row as a tuple. The cursor is
+    # unbuffered so rows are pulled from the server batch by batch instead of
+    # being materialised client-side; the connection is held until the
+    # generator is exhausted or closed.
+    conn = get_connection()
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        yield tuple(col[0] for col in cursor.description)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def csv_chunks(rows, compress=False):
+    # Encodes an iterable of rows (header first) as CSV text, one chunk per
+    # FETCH_BATCH rows, optionally gzip-compressed on the fly.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    for i, row in enumerate(rows):
+        writer.writerow(row)
+        if i % FETCH_BATCH == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+# Bytes kept in memory before the finished xlsx spills to disk
+XLSX_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+def write_xlsx(rows, sheet_name, output=None):
+    # Writes rows (header first) into a write-only openpyxl workbook, which
+    # serialises each row as it is appended instead of building a cell tree,
+    # and saves it into output (by default a temp file that spills to disk
+    # once it grows large). Returns the rewound file and the number of data
+    # rows written.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+
+    count = -1
+    for count, row in enumerate(rows):
+        sheet.append(row)
+
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE)
+    workbook.save(output)
+    output.seek(0)
+    return output, max(count, 0)
@@ -0,0 +1,165 @@
+import itertools
+import threading
+
+from db_config import get_connection
+
+# Number of change log rows kept for delta sync. Clients further behind than
+# this get the full list again.
+RETAIN_CHANGES = 50000
+PRUNE_EVERY = 1000
+
+# Versions are the change log's AUTO_INCREMENT ids, so recording a change
+# takes no shared lock. Ids are handed out at insert but become visible at
+# commit, so a change can commit after a higher one is already visible. The
+# version a client resumes from is therefore the newest change older than
+# SETTLE_SECONDS, by which time every lower id has committed or rolled back
+# (the hooks below run just before commit); the changes after it are sent
+# again on the next poll, which is harmless as they are applied by serial.
+SETTLE_SECONDS = 10
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS tv_inventory_changes (
+        version BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        serial_number VARCHAR(100) NOT NULL,
+        change_type ENUM('added', 'removed') NOT NULL,
+        changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# For logs created while versions came from a counter row
+# (a no-op on SQLite, where the table above is always new)
+AUTO_INCREMENT_SQL = [
+    "ALTER TABLE tv_inventory_changes MODIFY version BIGINT NOT NULL AUTO_INCREMENT",
+    "DROP TABLE IF EXISTS tv_inventory_version",
+]
+
+_table_ready = False
+_table_lock = threading.Lock()
+
+
+def ensure_table():
+    # DDL commits implicitly in MySQL, so it runs on its own connection once
+    # per process rather than inside a route's transaction.
+    global _table_ready
+    if _table_ready:
+        return
+    with _table_lock:
+        if _table_ready:
+            return
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            # Usually already created by migrations.py; a plain read avoids
+            # DDL queueing behind open transactions
+            try:
+                cursor.execute("SELECT 1 FROM tv_inventory_changes LIMIT 1")
+                cursor.fetchall()
+                ready = True
+            except Exception:
+                ready = False
+            if not ready:
+                for statement in CREATE_TABLES_SQL:
+                    cursor.execute(statement)
+                conn.commit()
+        finally:
+            conn.close()
+        _table_ready = True
+
+
+_recorded = itertools.count(1)
+
+
+def _due_for_prune(count):
+    # Roughly every PRUNE_EVERY changes per process
+    return any([next(_recorded) % PRUNE_EVERY == 0 for _ in range(count)])
+
+
+# Write hooks: call inside the same transaction as the tv_inventory change,
+# as the last statements before commit (see SETTLE_SECONDS).
+
+def _record(cursor, serial, change_type):
+    ensure_table()
+    cursor.execute("""
+        INSERT INTO tv_inventory_changes (serial_number, change_type)
+        VALUES (%s, %s)
+    """, (serial, change_type))
+
+    if _due_for_prune(1):
+        prune(cursor, cursor.lastrowid)
+
+
+def record_added(cursor, serial):
+    _record(cursor, serial, "added")
+
+
+def record_removed(cursor, serial):
+    _record(cursor, serial, "removed")
+
+
+def record_added_many(cursor, serials):
+    _record_many(cursor, serials, "added")
+
+
+def record_removed_many(cursor, serials):
+    _record_many(cursor, serials, "removed")
+
+
+def _record_many(cursor, serials, change_type):
+    if not serials:
+        return
+    ensure_table()
+    cursor.executemany("""
+        INSERT INTO tv_inventory_changes (serial_number, change_type)
+        VALUES (%s, %s)
+    """, [(serial, change_type) for serial in serials])
+
+    if _due_for_prune(len(serials)):
+        prune(cursor, cursor.lastrowid)
+
+
+def version_bounds(cursor):
+    # Expects a tuple cursor. Returns (oldest retained version, newest visible
+    # version, settled version to resume from).
+    ensure_table()
+    cursor.execute("SELECT MIN(version), MAX(version) FROM tv_inventory_changes")
+    oldest, current = cursor.fetchone()
+    if current is None:
+        return 1, 0, 0
+    # Walks back from the newest id, so only reads the unsettled tail
+    cursor.execute("""
+        SELECT version FROM tv_inventory_changes
+        WHERE changed_at <= CURRENT_TIMESTAMP - INTERVAL %s SECOND
+        ORDER BY version DESC
+        LIMIT 1
+    """, (SETTLE_SECONDS,))
+    row = cursor.fetchone()
+    settled = row[0] if row else oldest - 1
+    return oldest, current, settled
+
+
+def changes_since(cursor, since, current):
+    # Net effect of the log between since (exclusive) and current (inclusive):
+    # only the last change per serial matters.
+    cursor.execute("""
+        SELECT serial_number, change_type
+        FROM tv_inventory_changes
+        WHERE version > %s AND version <= %s
+        ORDER BY version ASC
+    """, (since, current))
+
+    latest = {}
+    for serial, change_type in cursor.fetchall():
+        latest[serial] = change_type
+
+    added = sorted(s for s, c in latest.items() if c == "added")
+    removed = sorted(s for s, c in latest.items() if c == "removed")
+    return added, removed
+
+
+def prune(cursor, current):
+    cursor.execute(
+        "DELETE FROM tv_inventory_changes WHERE version <= %s",
+        (current - RETAIN_CHANGES,)
+    )
@@ -0,0 +1,97 @@
+import bisect
+import threading
+import time
+
+from db_config import get_connection
+
+# Full reload interval; picks up items added through other worker processes
+RELOAD_INTERVAL = 300
+MAX_RESULTS = 10
+
+_lock = threading.Lock()
+_names = []          # sorted item names
+_trie = {}           # char -> child node; key None holds the names reachable below
+_loaded_at = None
+
+
+def _word_starts(lowered):
+    # Offsets where a word starts, so "hdmi cable" is found by "cab" as well
+    starts = [0]
+    for i in range(1, len(lowered)):
+        if not lowered[i - 1].isalnum() and lowered[i].isalnum():
+            starts.append(i)
+    return starts
+
+
+def _insert(trie, name):
+    lowered = name.lower()
+    for start in _word_starts(lowered):
+        node = trie
+        for ch in lowered[start:]:
+            node = node.setdefault(ch, {})
+            node.setdefault(None, set()).add(name)
+
+
+def _build(names):
+    trie = {}
+    for name in names:
+        _insert(trie, name)
+    return trie
+
+
+def _load():
+    global _names, _trie, _loaded_at
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT item_name FROM accessory_stock")
+        names = sorted(row[0] for row in cursor.fetchall())
+    finally:
+        conn.close()
+
+    trie = _build(names)
+    with _lock:
+        _names, _trie = names, trie
+        _loaded_at = time.monotonic()
+
+
+def search(query, limit=MAX_RESULTS):
+    # Ranked: names starting with the query, then names with a word starting
+    # with it, then plain substring matches; alphabetical within each group.
+    if _loaded_at is None or time.monotonic() - _loaded_at > RELOAD_INTERVAL:
+        _load()
+
+    query = query.lower()
+    with _lock:
+        if not query:
+            return _names[:limit]
+
+        node = _trie
+        for ch in query:
+            node = node.get(ch)
+            if node is None:
+                break
+        matches = node.get(None, set()) if node is not None else set()
+
+        ranked = sorted(matches, key=lambda n: (not n.lower().startswith(query), n))[:limit]
+        if len(ranked) < limit:
+            seen = set(ranked)
+            for name in _names:
+                if name not in seen and query in name.lower():
+                    ranked.append(name)
+                    if len(ranked) == limit:
+                        break
+        return ranked
+
+
+def add(name):
+    # Called by add_accessory after it inserts a new item
+    if _loaded_at is None:
+        return
+    with _lock:
+        i = bisect.bisect_left(_names, name)
+        if i < len(_names) and _names[i] == name:
+            return
+        _names.insert(i, name)
+        _insert(_trie, name)
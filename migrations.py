@@ -0,0 +1,275 @@
+import sys
+
+from db_config import DIALECT, get_connection
+import auth
+import inventory_changes
+import sales_rollup
+import sales_search
+import stock
+import stock_alerts
+import stock_ledger
+
+# Versioned schema bootstrap. Each migration is (version, description, steps);
+# a step is either an SQL string or a callable taking a cursor. Applied
+# versions are recorded in schema_migrations so running this again only
+# applies what is new. Steps are written to be safe on databases that were
+# created by hand before this module existed.
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS admin_login (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) NOT NULL,
+        phone_no VARCHAR(20),
+        password VARCHAR(255) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tv_inventory (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        serial_number VARCHAR(100) NOT NULL,
+        brand VARCHAR(100) NOT NULL,
+        size VARCHAR(20) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'available'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS b2c_tv_sales (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        product_id INT NOT NULL,
+        customer_name VARCHAR(255),
+        phone VARCHAR(20),
+        price DECIMAL(12, 2),
+        sale_date DATE,
+        warranty VARCHAR(50),
+        brand VARCHAR(100),
+        size VARCHAR(20)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS b2b_tv_sales (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        product_id INT NOT NULL,
+        business_name VARCHAR(255),
+        phone VARCHAR(20),
+        price DECIMAL(12, 2),
+        sale_date DATE,
+        warranty VARCHAR(50),
+        brand VARCHAR(100),
+        size VARCHAR(20)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS b2c_accessory_sales (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        item_name VARCHAR(255) NOT NULL,
+        quantity INT NOT NULL,
+        customer_name VARCHAR(255),
+        phone VARCHAR(20),
+        labour_name VARCHAR(50),
+        price DECIMAL(12, 2),
+        sale_date DATE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS accessory_stock (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        item_name VARCHAR(255) NOT NULL,
+        main_stock INT NOT NULL DEFAULT 0,
+        prabhu_stock INT NOT NULL DEFAULT 0,
+        tamil_stock INT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+# Access paths used by the routes in app.py: (table, index name, definition).
+# InnoDB appends the primary key to every secondary index, so (status) also
+# serves "WHERE status = ? AND id > ? ORDER BY id" and (status, brand) the
+# same with a brand filter.
+HOT_PATH_INDEXES = [
+    ("tv_inventory", "uq_tv_inventory_serial", "UNIQUE (serial_number)"),
+    ("tv_inventory", "idx_tv_inventory_status", "(status)"),
+    ("tv_inventory", "idx_tv_inventory_status_brand", "(status, brand)"),
+    ("b2c_tv_sales", "idx_b2c_tv_sales_date", "(sale_date, id)"),
+    ("b2c_tv_sales", "idx_b2c_tv_sales_product", "(product_id)"),
+    ("b2b_tv_sales", "idx_b2b_tv_sales_date", "(sale_date, id)"),
+    ("b2b_tv_sales", "idx_b2b_tv_sales_product", "(product_id)"),
+    ("b2c_accessory_sales", "idx_b2c_accessory_sales_date", "(sale_date, id)"),
+    ("b2c_accessory_sales", "idx_b2c_accessory_sales_item", "(item_name)"),
+    ("accessory_stock", "uq_accessory_stock_item", "UNIQUE (item_name)"),
+    ("admin_login", "idx_admin_login_username", "(username)"),
+    ("admin_login", "idx_admin_login_phone", "(phone_no)"),
+]
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def index_exists(cursor, table, name):
+    if DIALECT == "sqlite":
+        if name.startswith("ft_"):
+            # FULLTEXT indexes are skipped on SQLite (see db_sqlite)
+            return True
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+            (table, name)
+        )
+        return cursor.fetchone() is not None
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    return cursor.fetchone() is not None
+
+
+def column_exists(cursor, table, column):
+    if DIALECT == "sqlite":
+        cursor.execute("SELECT 1 FROM pragma_table_info(%s) WHERE name = %s", (table, column))
+        return cursor.fetchone() is not None
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def add_index(table, name, definition):
+    def step(cursor):
+        if index_exists(cursor, table, name):
+            return
+        kind, _, columns = definition.partition(" ")
+        if kind in ("UNIQUE", "FULLTEXT"):
+            cursor.execute(f"ALTER TABLE {table} ADD {kind} INDEX {name} {columns}")
+        else:
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} {definition}")
+    return step
+
+
+def add_column(table, column, definition):
+    def step(cursor):
+        if not column_exists(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+# tv_inventory.added_at: units that exist when the column is added have no
+# recorded arrival time. They get the first 'added' entry still in the change
+# log (see inventory_changes.RETAIN_CHANGES) and are otherwise left NULL,
+# which the ageing reports and aged-stock alerts skip. New units default to
+# the insert time.
+ADDED_AT_DEFAULT_SQL = "ALTER TABLE tv_inventory MODIFY added_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP"
+
+FIRST_ADDED_SQL = """
+    SELECT serial_number, MIN(changed_at) AS first_added
+    FROM tv_inventory_changes
+    WHERE change_type = 'added'
+    GROUP BY serial_number
+"""
+
+
+def backfill_added_at(cursor):
+    if DIALECT == "sqlite":
+        cursor.execute(f"""
+            UPDATE tv_inventory SET added_at = c.first_added
+            FROM ({FIRST_ADDED_SQL}) AS c
+            WHERE c.serial_number = tv_inventory.serial_number AND tv_inventory.added_at IS NULL
+        """)
+    else:
+        cursor.execute(f"""
+            UPDATE tv_inventory t
+            JOIN ({FIRST_ADDED_SQL}) AS c ON c.serial_number = t.serial_number
+            SET t.added_at = c.first_added
+            WHERE t.added_at IS NULL
+        """)
+
+
+MIGRATIONS = [
+    (1, "base tables", CREATE_TABLES),
+    (2, "hot path indexes", [add_index(*index) for index in HOT_PATH_INDEXES]),
+    (3, "tv inventory change log",
+        inventory_changes.CREATE_TABLES_SQL + inventory_changes.AUTO_INCREMENT_SQL),
+    (4, "sales search indexes", [add_index(*index) for index in sales_search.REQUIRED_INDEXES]),
+    (5, "per-location accessory stock", stock.CREATE_TABLES_SQL + stock.MIGRATE_COLUMNS_SQL),
+    (6, "stock ledger and opening snapshot",
+        stock_ledger.CREATE_TABLES_SQL + [stock_ledger.take_snapshot_with]),
+    (7, "daily sales rollup", sales_rollup.CREATE_TABLES_SQL + [sales_rollup.rebuild_with]),
+    (8, "tv_inventory.added_at", [
+        add_column("tv_inventory", "added_at", "TIMESTAMP NULL DEFAULT NULL"),
+        backfill_added_at,
+        ADDED_AT_DEFAULT_SQL,
+    ]),
+    (9, "stock alerts", stock_alerts.CREATE_TABLES_SQL + [
+        add_column("accessory_location_stock", "low_since", "TIMESTAMP NULL DEFAULT NULL"),
+        stock_alerts.initial_state_with,
+    ] + [add_index(*index) for index in stock_alerts.REQUIRED_INDEXES]),
+    (10, "hash admin passwords", [
+        # Hashes are ~90 characters; a narrower hand-made column would
+        # truncate them (a no-op on SQLite, whose columns have no length)
+        "ALTER TABLE admin_login MODIFY password VARCHAR(255) NOT NULL",
+        auth.hash_existing_with,
+    ]),
+]
+
+
+def expected_indexes():
+    return HOT_PATH_INDEXES + sales_search.REQUIRED_INDEXES + stock_alerts.REQUIRED_INDEXES
+
+
+def applied_versions(cursor):
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(log=print):
+    # DDL commits implicitly in MySQL, so a migration that fails part way is
+    # not rolled back; every step is idempotent so rerunning finishes it.
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        for version, description, steps in MIGRATIONS:
+            if version in done:
+                continue
+            log(f"Applying migration {version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def missing_indexes():
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        return [
+            (table, name)
+            for table, name, _ in expected_indexes()
+            if not index_exists(cursor, table, name)
+        ]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        missing = missing_indexes()
+        for table, name in missing:
+            print(f"Missing index {name} on {table}")
+        sys.exit(1 if missing else 0)
+    migrate()
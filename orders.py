@@ -0,0 +1,175 @@
+import inventory_changes
+import sales_rollup
+import stock
+
+CHANNELS = {
+    "b2c": ("b2c_tv_sales", "customer_name"),
+    "b2b": ("b2b_tv_sales", "business_name"),
+}
+MAX_LINES = 500
+
+
+class OrderError(Exception):
+    def __init__(self, message, status=400, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def parse_order(data):
+    if not isinstance(data, dict):
+        raise OrderError("Expected a JSON object")
+
+    channel = data.get("channel", "b2c")
+    if channel not in CHANNELS:
+        raise OrderError("channel must be b2c or b2b")
+
+    customer = data.get("customer") or {}
+    if not isinstance(customer, dict):
+        raise OrderError("customer must be an object")
+    if not customer.get("name") or not isinstance(customer["name"], str):
+        raise OrderError("customer.name is required")
+    if not isinstance(customer.get("phone", ""), (str, int)):
+        raise OrderError("customer.phone must be a string")
+    if not data.get("date") or not isinstance(data["date"], str):
+        raise OrderError("date is required")
+
+    tvs = data.get("tvs") or []
+    accessories = data.get("accessories") or []
+    if not isinstance(tvs, list) or not isinstance(accessories, list):
+        raise OrderError("tvs and accessories must be lists")
+    if not all(isinstance(line, dict) for line in tvs + accessories):
+        raise OrderError("Every TV and accessory line must be an object")
+    if not tvs and not accessories:
+        raise OrderError("Order has no items")
+    if len(tvs) + len(accessories) > MAX_LINES:
+        raise OrderError(f"At most {MAX_LINES} lines per order")
+
+    if not all(isinstance(tv.get("serial"), (str, int)) for tv in tvs):
+        raise OrderError("Every TV line needs a serial")
+    serials = [str(tv["serial"]).strip() for tv in tvs]
+    if not all(serials):
+        raise OrderError("Every TV line needs a serial")
+    if len(set(serials)) != len(serials):
+        raise OrderError("Duplicate serials in order")
+
+    for line in accessories:
+        try:
+            line["quantity"] = int(line.get("quantity", 0))
+        except (TypeError, ValueError):
+            raise OrderError("Accessory quantity must be an integer")
+        if line["quantity"] <= 0 or not line.get("item") or not isinstance(line["item"], str):
+            raise OrderError("Accessory lines need an item and a positive quantity")
+
+    return channel, customer, tvs, accessories
+
+
+def _sell_tvs(cursor, channel, customer, data, tvs):
+    table, name_col = CHANNELS[channel]
+    serials = [str(tv["serial"]).strip() for tv in tvs]
+
+    # Lock every requested unit in one statement
+    cursor.execute(f"""
+        SELECT id, serial_number, brand, size FROM tv_inventory
+        WHERE serial_number IN ({_placeholders(serials)}) AND status = 'available'
+        FOR UPDATE
+    """, tuple(serials))
+    found = {row[1]: row for row in cursor.fetchall()}
+
+    missing = [s for s in serials if s not in found]
+    if missing:
+        raise OrderError("TVs not found or already sold", status=409, details={"serials": missing})
+
+    cursor.executemany(f"""
+        INSERT INTO {table} (
+            product_id, {name_col}, phone, price, sale_date, warranty, brand, size
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [
+        (
+            found[serial][0],
+            customer.get("name"),
+            customer.get("phone"),
+            tv.get("price"),
+            data.get("date"),
+            tv.get("warranty", data.get("warranty")),
+            found[serial][2],
+            found[serial][3],
+        )
+        for serial, tv in zip(serials, tvs)
+    ])
+
+    ids = [found[serial][0] for serial in serials]
+    cursor.execute(
+        f"UPDATE tv_inventory SET status = 'sold' WHERE id IN ({_placeholders(ids)})",
+        tuple(ids)
+    )
+
+    # A unit has at most one sale row (delete_sale removes it), so the new
+    # sale ids can be read back by product id
+    cursor.execute(
+        f"SELECT id, product_id FROM {table} WHERE product_id IN ({_placeholders(ids)})",
+        tuple(ids)
+    )
+    sale_ids = {product_id: sale_id for sale_id, product_id in cursor.fetchall()}
+    return ids, [{"serial": serial, "sale_id": sale_ids.get(found[serial][0])} for serial in serials]
+
+
+def _sell_accessories(cursor, customer, data, lines):
+    sale_ids, taken = [], []
+    for line in lines:
+        location = line.get("labour") or stock.DEFAULT_LOCATION
+        cursor.execute("""
+            INSERT INTO b2c_accessory_sales (
+                item_name, quantity, customer_name, phone,
+                labour_name, price, sale_date
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (
+            line["item"],
+            line["quantity"],
+            customer.get("name"),
+            customer.get("phone"),
+            location,
+            line.get("price"),
+            data.get("date"),
+        ))
+        sale_ids.append({"item": line["item"], "sale_id": cursor.lastrowid})
+        taken.append((line["item"], location, line["quantity"], cursor.lastrowid))
+
+    # Checked after the inserts so ledger rows can reference the sale ids;
+    # a shortfall rolls the whole order back.
+    short = stock.take_many(cursor, taken, "sale")
+    if short:
+        raise OrderError("Insufficient stock", status=409, details={"accessories": short})
+    return sale_ids
+
+
+def submit_order(conn, data):
+    # Applies the whole order on conn without committing. Returns the sold TV
+    # ids and the created sale ids; raises OrderError if any line can't be met.
+    channel, customer, tvs, accessories = parse_order(data)
+    cursor = conn.cursor()
+
+    tv_ids, tv_sales = [], []
+    if tvs:
+        tv_ids, tv_sales = _sell_tvs(cursor, channel, customer, data, tvs)
+
+    accessory_sales = []
+    if accessories:
+        accessory_sales = _sell_accessories(cursor, customer, data, accessories)
+
+    # Just before the caller commits (see inventory_changes)
+    if tvs:
+        inventory_changes.record_removed_many(cursor, [str(tv["serial"]).strip() for tv in tvs])
+
+    # The rollup rows are shared with every other sale that day, so they
+    # come last and are only held for the commit
+    if tv_sales:
+        sales_rollup.add_sales(cursor, f"{channel}_tv", [sale["sale_id"] for sale in tv_sales if sale["sale_id"]])
+    if accessory_sales:
+        sales_rollup.add_sales(cursor, "b2c_accessory", [sale["sale_id"] for sale in accessory_sales])
+
+    return tv_ids, {"tv_sales": tv_sales, "accessory_sales": accessory_sales}
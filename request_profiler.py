@@ -0,0 +1,163 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Opt-in cProfile capture of single requests, for finding out where a slow
+# page spends its time (SQL, Python, template rendering, pandas/openpyxl).
+#
+# A logged-in user asks for a profile with the X-Profile: 1 header or a
+# ?_profile=1 query flag; IMS_PROFILE_SAMPLE_RATE additionally profiles that
+# fraction of logged-in requests at random. IMS_PROFILE_USERS, if set,
+# limits profiling to those usernames. Each profile is written to
+# PROFILE_DIR as <id>.prof (load with pstats or snakeviz) plus <id>.json
+# with the request and its top frames, so every worker's profiles are listed
+# at /profiles. Only the newest KEEP profiles are kept.
+#
+# cProfile can only run one profiler at a time, so a request that asks while
+# another is being profiled just isn't profiled. The profile also covers
+# other threads' work while it runs. When nothing asks for a profile the cost
+# is one header and one query-string lookup per request.
+
+ENABLED = os.environ.get("IMS_PROFILING", "1") != "0"
+PROFILE_DIR = os.environ.get("IMS_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ims_profiles"))
+SAMPLE_RATE = float(os.environ.get("IMS_PROFILE_SAMPLE_RATE", 0))
+USERS = {u.strip() for u in os.environ.get("IMS_PROFILE_USERS", "").split(",") if u.strip()}
+KEEP = 50
+TOP_FRAMES = 40
+
+HEADER = "X-Profile"
+QUERY_FLAG = "_profile"
+
+_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+_active = threading.Lock()
+
+
+class Capture:
+    def __init__(self, method, path, route):
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.route = route
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.finished = False
+
+
+def wanted(user, flagged):
+    # flagged: the request carried the header or query flag
+    if not ENABLED or user is None or (USERS and user not in USERS):
+        return False
+    return flagged or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+
+
+def start(method, path, route):
+    # Returns a running Capture, or None if another request holds the profiler
+    if not _active.acquire(blocking=False):
+        return None
+    capture = Capture(method, path, route)
+    try:
+        capture.profile.enable()
+    except ValueError:
+        # Some other profiler (a debugger, coverage) is active
+        _active.release()
+        return None
+    return capture
+
+
+def top_frames(profile, limit=TOP_FRAMES):
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, function), (cc, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": function,
+            "file": filename,
+            "line": line,
+            "calls": calls,
+            "primitive_calls": cc,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+    return rows[:limit]
+
+
+def finish(capture, status):
+    # Stops the capture and writes its files. Safe to call twice.
+    if capture.finished:
+        return
+    capture.finished = True
+    try:
+        capture.profile.disable()
+    finally:
+        _active.release()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    capture.profile.dump_stats(os.path.join(PROFILE_DIR, f"{capture.id}.prof"))
+    summary = {
+        "id": capture.id,
+        "method": capture.method,
+        "path": capture.path,
+        "route": capture.route,
+        "status": status,
+        "started_at": capture.started_at.isoformat(timespec="seconds"),
+        "duration_ms": round((time.perf_counter() - capture.started) * 1000, 3),
+        "top_frames": top_frames(capture.profile),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{capture.id}.json"), "w") as f:
+        json.dump(summary, f)
+    _prune()
+
+
+def _ids():
+    # Newest first; ids start with the capture time
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-5] for name in names if name.endswith(".json") and _ID.match(name[:-5])), reverse=True)
+
+
+def _prune():
+    for profile_id in _ids()[KEEP:]:
+        for ext in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+def load(profile_id):
+    if not _ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def recent():
+    # Summaries without the frames, newest first
+    summaries = []
+    for profile_id in _ids():
+        summary = load(profile_id)
+        if summary:
+            summary.pop("top_frames", None)
+            summaries.append(summary)
+    return summaries
+
+
+def prof_path(profile_id):
+    if not _ID.match(profile_id):
+        return None
+    path = os.path.abspath(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    return path if os.path.exists(path) else None
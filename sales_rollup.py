@@ -0,0 +1,146 @@
+import sys
+
+from db_config import get_connection
+
+# Units and revenue per (day, sale type, brand, size, item), kept in step with
+# the sales tables by the routes that insert and delete sales, so reports read
+# a few rows per day instead of scanning every sale. TV rows leave item_name
+# empty; accessory rows leave brand and size empty. Sale types use the same
+# names as delete_sale: b2c_tv, b2b_tv and b2c_accessory.
+#
+# The rollup row for a (day, brand, size) is shared by every sale of that
+# kind on that day, so callers update it as the last statement before commit
+# to keep its lock short. It stays inside the sale's transaction so the
+# rollup can't drift from the sales tables; the price is that sales of the
+# same kind on the same day still queue for each other's commit.
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+        sale_date DATE NOT NULL,
+        sale_type VARCHAR(20) NOT NULL,
+        brand VARCHAR(100) NOT NULL DEFAULT '',
+        size VARCHAR(20) NOT NULL DEFAULT '',
+        item_name VARCHAR(255) NOT NULL DEFAULT '',
+        units INT NOT NULL DEFAULT 0,
+        revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (sale_date, sale_type, brand, size, item_name)
+    )
+    """,
+]
+
+# sale type: (table, brand, size, item_name, units) as SQL expressions
+SALE_TYPES = {
+    "b2c_tv": ("b2c_tv_sales", "COALESCE(brand, '')", "COALESCE(size, '')", "''", "1"),
+    "b2b_tv": ("b2b_tv_sales", "COALESCE(brand, '')", "COALESCE(size, '')", "''", "1"),
+    "b2c_accessory": ("b2c_accessory_sales", "''", "''", "item_name", "quantity"),
+}
+
+# Report grouping keys and the rollup columns behind them
+GROUP_COLUMNS = {
+    "date": "sale_date",
+    "type": "sale_type",
+    "brand": "brand",
+    "size": "size",
+    "item": "item_name",
+}
+DEFAULT_GROUP = ("date", "type")
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _apply(cursor, sale_type, sale_ids, sign):
+    if not sale_ids:
+        return
+    table, brand, size, item, units = SALE_TYPES[sale_type]
+    # Reads the stored sale rows so the rollup sees the same date and price
+    # values MySQL converted the form input to
+    cursor.execute(f"""
+        INSERT INTO daily_sales_rollup (sale_date, sale_type, brand, size, item_name, units, revenue)
+        SELECT sale_date, %s, {brand}, {size}, {item}, %s * {units}, %s * COALESCE(price, 0)
+        FROM {table}
+        WHERE id IN ({_placeholders(sale_ids)}) AND sale_date IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            units = units + VALUES(units),
+            revenue = revenue + VALUES(revenue)
+    """, (sale_type, sign, sign) + tuple(sale_ids))
+
+
+def add_sales(cursor, sale_type, sale_ids):
+    # Call after inserting the sales, in the same transaction
+    _apply(cursor, sale_type, sale_ids, 1)
+
+
+def remove_sales(cursor, sale_type, sale_ids):
+    # Call before deleting the sales, in the same transaction
+    _apply(cursor, sale_type, sale_ids, -1)
+
+
+def rebuild_with(cursor, start=None, end=None):
+    # Recomputes the rollup from the sales tables, for all days or for
+    # start..end inclusive (YYYY-MM-DD strings).
+    conditions, params = [], []
+    if start:
+        conditions.append("sale_date >= %s")
+        params.append(start)
+    if end:
+        conditions.append("sale_date <= %s")
+        params.append(end)
+    where = "".join(f" AND {condition}" for condition in conditions)
+
+    cursor.execute("DELETE FROM daily_sales_rollup WHERE 1 = 1" + where, tuple(params))
+    for sale_type, (table, brand, size, item, units) in SALE_TYPES.items():
+        cursor.execute(f"""
+            INSERT INTO daily_sales_rollup (sale_date, sale_type, brand, size, item_name, units, revenue)
+            SELECT sale_date, %s, {brand}, {size}, {item}, SUM({units}), SUM(COALESCE(price, 0))
+            FROM {table}
+            WHERE sale_date IS NOT NULL{where}
+            GROUP BY sale_date, {brand}, {size}, {item}
+        """, (sale_type,) + tuple(params))
+
+
+def rebuild(start=None, end=None):
+    conn = get_connection()
+    try:
+        rebuild_with(conn.cursor(), start, end)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def report(cursor, start, end, group_by=DEFAULT_GROUP, sale_type=None):
+    # Units and revenue between start and end (inclusive) grouped by the
+    # GROUP_COLUMNS keys in group_by, read from the rollup only.
+    columns = [GROUP_COLUMNS[key] for key in group_by]
+    query = "SELECT " + "".join(f"{column}, " for column in columns) + """
+            SUM(units), SUM(revenue)
+        FROM daily_sales_rollup
+        WHERE sale_date BETWEEN %s AND %s
+    """
+    params = [start, end]
+    if sale_type:
+        query += " AND sale_type = %s"
+        params.append(sale_type)
+    if columns:
+        query += " GROUP BY " + ", ".join(columns) + " ORDER BY " + ", ".join(columns)
+    cursor.execute(query, tuple(params))
+
+    rows = []
+    for row in cursor.fetchall():
+        entry = {key: row[i] for i, key in enumerate(group_by)}
+        if "date" in entry:
+            entry["date"] = entry["date"].isoformat()
+        entry["units"] = int(row[-2] or 0)
+        entry["revenue"] = float(row[-1] or 0)
+        rows.append(entry)
+    return rows
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["rebuild"] and len(sys.argv) in (2, 4):
+        rebuild(*sys.argv[2:4])
+        print("Rebuilt daily_sales_rollup")
+    else:
+        print("Usage: python sales_rollup.py rebuild [START_DATE END_DATE]")
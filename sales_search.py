@@ -0,0 +1,97 @@
+import re
+
+from db_config import DIALECT
+
+# Search strategies for the sales history / export search box.
+#
+# "indexed" (default) classifies each token and picks an access path an index
+# can serve:
+#   - all digits        -> phone prefix (and serial prefix for TV sales)
+#   - letters + digits  -> serial prefix (TV sales) / name full-text (accessories)
+#   - words             -> FULLTEXT MATCH on the name columns in boolean mode,
+#                          or a name prefix for words shorter than the
+#                          full-text minimum token size
+# "contains" is the original LIKE '%term%' scan across all columns.
+SEARCH_MODES = ("indexed", "contains")
+
+# InnoDB's default innodb_ft_min_token_size
+FT_MIN_TOKEN = 3
+
+# Indexes the indexed mode relies on: (table, index name, definition).
+# Created by migrations.py; serial prefixes use its unique serial_number index.
+REQUIRED_INDEXES = [
+    ("b2c_tv_sales", "ft_b2c_tv_sales_name", "FULLTEXT (customer_name)"),
+    ("b2c_tv_sales", "idx_b2c_tv_sales_phone", "(phone)"),
+    ("b2c_tv_sales", "idx_b2c_tv_sales_name", "(customer_name)"),
+    ("b2b_tv_sales", "ft_b2b_tv_sales_name", "FULLTEXT (business_name)"),
+    ("b2b_tv_sales", "idx_b2b_tv_sales_phone", "(phone)"),
+    ("b2b_tv_sales", "idx_b2b_tv_sales_name", "(business_name)"),
+    ("b2c_accessory_sales", "ft_b2c_accessory_sales_names", "FULLTEXT (customer_name, item_name)"),
+    ("b2c_accessory_sales", "idx_b2c_accessory_sales_phone", "(phone)"),
+    ("b2c_accessory_sales", "idx_b2c_accessory_sales_name", "(customer_name)"),
+]
+
+_FT_SPECIAL = re.compile(r'[+\-<>()~*"@]')
+
+
+def parse_mode(value):
+    return value if value in SEARCH_MODES else "indexed"
+
+
+def _like_prefix(token):
+    escaped = token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _contains_condition(search, columns):
+    s = f"%{search}%"
+    sql = " AND (" + " OR ".join(f"{col} LIKE %s" for col in columns) + ")"
+    return sql, [s] * len(columns)
+
+
+def search_condition(search, name_cols, phone_col, serial_col=None, mode="indexed"):
+    # Returns an " AND (...)" SQL fragment and its params for the search box.
+    # name_cols must match a FULLTEXT index exactly, in order.
+    if not search:
+        return "", []
+
+    if mode == "contains":
+        columns = list(name_cols) + [phone_col] + ([serial_col] if serial_col else [])
+        return _contains_condition(search, columns)
+
+    clauses = []
+    params = []
+    words = []
+
+    for token in search.split():
+        if token.isdigit():
+            if serial_col:
+                clauses.append(f"({phone_col} LIKE %s OR {serial_col} LIKE %s)")
+                params += [_like_prefix(token), _like_prefix(token)]
+            else:
+                clauses.append(f"{phone_col} LIKE %s")
+                params.append(_like_prefix(token))
+        elif serial_col and any(c.isdigit() for c in token):
+            clauses.append(f"{serial_col} LIKE %s")
+            params.append(_like_prefix(token))
+        else:
+            word = _FT_SPECIAL.sub("", token)
+            if len(word) >= FT_MIN_TOKEN:
+                words.append(word)
+            elif word:
+                # Too short for the full-text index; prefix on the leading name column
+                clauses.append(f"{name_cols[0]} LIKE %s")
+                params.append(_like_prefix(word))
+
+    if words and DIALECT == "sqlite":
+        # No FULLTEXT index: match a word start in any of the name columns
+        for word in words:
+            clauses.append("(" + " OR ".join(f"{col} LIKE %s OR {col} LIKE %s" for col in name_cols) + ")")
+            params += [_like_prefix(word), "% " + _like_prefix(word)] * len(name_cols)
+    elif words:
+        clauses.append(f"MATCH({', '.join(name_cols)}) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(" ".join(f"+{w}*" for w in words))
+
+    if not clauses:
+        return "", []
+    return " AND " + " AND ".join(clauses), params
@@ -0,0 +1,193 @@
+import argparse
+import random
+import string
+from datetime import date, datetime, timedelta
+
+from db_config import get_connection
+import migrations
+import sales_rollup
+import stock_alerts
+import stock_ledger
+
+# Seeded synthetic data for load tests and benchmarks. The same arguments
+# always produce the same rows, so results at a given scale are comparable
+# between runs. Run against an empty database (see migrations.py):
+#
+#   IMS_DB_BACKEND=sqlite IMS_SQLITE_PATH=bench.sqlite3 python seed_data.py --tvs 100000
+
+BRANDS = ["Samsung", "LG", "Sony", "TCL", "Panasonic", "Philips", "Hisense", "Vu", "OnePlus", "Xiaomi"]
+SIZES = ["24", "32", "40", "43", "50", "55", "65", "75"]
+SIZE_WEIGHTS = [4, 20, 10, 22, 14, 16, 10, 4]
+ACCESSORIES = [
+    "HDMI Cable", "Wall Mount", "Table Stand", "Remote", "Power Cable", "Soundbar",
+    "Set Top Box", "Voltage Stabilizer", "Optical Cable", "Screen Cleaner",
+]
+FIRST_NAMES = ["Arun", "Priya", "Karthik", "Divya", "Ravi", "Meena", "Suresh", "Lakshmi", "Vijay", "Anitha"]
+LAST_NAMES = ["Kumar", "Raj", "Devi", "Sundaram", "Babu", "Priya", "Murugan", "Selvam"]
+BUSINESS_SUFFIXES = ["Electronics", "Traders", "Enterprises", "Agencies", "Stores"]
+
+BATCH = 1000
+PRICES = {"24": 9000, "32": 14000, "40": 21000, "43": 26000, "50": 34000, "55": 45000, "65": 70000, "75": 110000}
+
+
+def _zipf_weights(n, skew):
+    # Brand popularity: the k-th brand is 1/k^skew as common as the first
+    return [1 / (k ** skew) for k in range(1, n + 1)]
+
+
+class _Writer:
+    # Buffers rows for one INSERT and writes them BATCH at a time, so a
+    # million-row run never holds more than a batch in memory
+    def __init__(self, cursor, sql, on_flush=None):
+        self.cursor = cursor
+        self.sql = sql
+        self.on_flush = on_flush
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            if self.on_flush:
+                self.on_flush(self.rows)
+            self.rows = []
+
+
+def _phone(rng):
+    return "9" + "".join(rng.choice(string.digits) for _ in range(9))
+
+
+def _customer(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def generate(tvs=10000, accessory_sales=None, days=365, sold_fraction=0.6, b2b_fraction=0.2,
+             brand_skew=1.1, seed=42, end=None, log=print):
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+    accessory_sales = tvs // 2 if accessory_sales is None else accessory_sales
+    brand_weights = _zipf_weights(len(BRANDS), brand_skew)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # TV units, added over the period; sold units get one sale each. The
+        # sales wait until their units' batch is written and its ids read back.
+        pending_sales = []  # (table, serial, sale row without product_id)
+
+        def write_sales(tv_rows):
+            if not pending_sales:
+                return
+            cursor.execute(
+                f"SELECT serial_number, id FROM tv_inventory WHERE serial_number IN ({', '.join(['%s'] * len(tv_rows))})",
+                tuple(row[0] for row in tv_rows)
+            )
+            ids = dict(cursor.fetchall())
+            for table, serial, sale in pending_sales:
+                tv_sales[table].add((ids[serial],) + sale)
+            pending_sales.clear()
+
+        inventory = _Writer(cursor, """
+            INSERT INTO tv_inventory (serial_number, brand, size, status, added_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, on_flush=write_sales)
+        tv_sales = {
+            table: _Writer(cursor, f"""
+                INSERT INTO {table} (product_id, {name_col}, phone, price, sale_date, warranty, brand, size)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """)
+            for table, name_col in (("b2c_tv_sales", "customer_name"), ("b2b_tv_sales", "business_name"))
+        }
+        for i in range(1, tvs + 1):
+            brand = rng.choices(BRANDS, brand_weights)[0]
+            size = rng.choices(SIZES, SIZE_WEIGHTS)[0]
+            added = start + timedelta(days=rng.randrange(days))
+            sold = rng.random() < sold_fraction
+            added_at = datetime.combine(added, datetime.min.time()) + timedelta(seconds=rng.randrange(86400))
+            serial = f"SN{seed:03d}{i:09d}"
+            if sold:
+                sale_date = added + timedelta(days=min(int(rng.expovariate(1 / 30)), (end - added).days))
+                price = round(PRICES[size] * rng.uniform(0.9, 1.15), -2)
+                warranty = rng.choice(["1 year", "2 years", "3 years"])
+                if rng.random() < b2b_fraction:
+                    name = f"{rng.choice(LAST_NAMES)} {rng.choice(BUSINESS_SUFFIXES)}"
+                    pending_sales.append(
+                        ("b2b_tv_sales", serial, (name, _phone(rng), price, sale_date, warranty, brand, size))
+                    )
+                else:
+                    pending_sales.append(
+                        ("b2c_tv_sales", serial, (_customer(rng), _phone(rng), price, sale_date, warranty, brand, size))
+                    )
+            inventory.add((serial, brand, size, "sold" if sold else "available", added_at))
+        # Write what is left in the buffers
+        inventory.flush()
+        for writer in tv_sales.values():
+            writer.flush()
+        log(f"Inserted {inventory.count} TVs, {tv_sales['b2c_tv_sales'].count} B2C "
+            f"and {tv_sales['b2b_tv_sales'].count} B2B sales")
+
+        # Accessories: stock per location, and sales spread over the period
+        cursor.execute("SELECT name FROM stock_locations ORDER BY sort_order, name")
+        locations = [row[0] for row in cursor.fetchall()]
+        cursor.executemany("INSERT INTO accessory_stock (item_name) VALUES (%s)", [(item,) for item in ACCESSORIES])
+        quantities = [(item, location, rng.randrange(0, 200)) for item in ACCESSORIES for location in locations]
+        cursor.executemany("""
+            INSERT INTO accessory_location_stock (item_name, location, qty) VALUES (%s, %s, %s)
+        """, quantities)
+        # Through the ledger like any other stock change, so /stock_as_of sees it
+        stock_ledger.record(cursor, [(item, location, qty, "seed", None) for item, location, qty in quantities if qty])
+        stock_alerts.initial_state_with(cursor)
+
+        sales = _Writer(cursor, """
+            INSERT INTO b2c_accessory_sales (item_name, quantity, customer_name, phone, labour_name, price, sale_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """)
+        for _ in range(accessory_sales):
+            quantity = rng.choice([1, 1, 1, 2, 2, 3, 5])
+            sales.add((
+                rng.choice(ACCESSORIES), quantity, _customer(rng), _phone(rng), rng.choice(locations),
+                quantity * rng.choice([150, 250, 400, 900, 1500]), start + timedelta(days=rng.randrange(days)),
+            ))
+        sales.flush()
+        log(f"Inserted {len(ACCESSORIES)} accessories at {len(locations)} locations, {sales.count} accessory sales")
+
+        sales_rollup.rebuild_with(cursor)
+        # Starts as-of replays after the seeded rows
+        stock_ledger.take_snapshot_with(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate the database with seeded synthetic data")
+    parser.add_argument("--tvs", type=int, default=10000, help="TV units to create")
+    parser.add_argument("--accessory-sales", type=int, default=None, help="accessory sales (default: tvs / 2)")
+    parser.add_argument("--days", type=int, default=365, help="days of history ending today")
+    parser.add_argument("--sold-fraction", type=float, default=0.6, help="share of TVs that are sold")
+    parser.add_argument("--b2b-fraction", type=float, default=0.2, help="share of TV sales that are B2B")
+    parser.add_argument("--brand-skew", type=float, default=1.1, help="Zipf exponent for brand popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    migrations.migrate()
+    generate(
+        tvs=args.tvs,
+        accessory_sales=args.accessory_sales,
+        days=args.days,
+        sold_fraction=args.sold_fraction,
+        b2b_fraction=args.b2b_fraction,
+        brand_skew=args.brand_skew,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from db_config import get_connection
+
+# Full reload interval; picks up writes made by other worker processes
+RELOAD_INTERVAL = 300
+MAX_COMPLETIONS = 10
+# Only available units are indexed, so the index stays the size of the stock
+# rather than of every unit ever sold. Other serials (sold, or not in the
+# database) are looked up one at a time and the answer remembered this long,
+# so a partial serial typed into the dashboard costs one query rather than
+# one per keystroke. Changes made by this process show up at once (put()).
+MISS_TTL = 10
+MAX_MISSES = 10000
+
+_lock = threading.Lock()
+_by_serial = {}        # serial_number -> tv dict, available units only
+_by_id = {}            # id -> serial_number
+_available = []        # sorted _by_serial keys, for prefix completion
+_loaded_at = None
+_misses = OrderedDict()  # serial_number -> (time of the lookup, tv or None)
+
+
+def _load():
+    global _by_serial, _by_id, _available, _loaded_at
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, serial_number, brand, size, status
+            FROM tv_inventory
+            WHERE status = 'available'
+        """)
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    by_serial = {row["serial_number"]: row for row in rows}
+    by_id = {row["id"]: row["serial_number"] for row in rows}
+    available = sorted(by_serial)
+
+    with _lock:
+        _by_serial, _by_id, _available = by_serial, by_id, available
+        _misses.clear()
+        _loaded_at = time.monotonic()
+
+
+def _ensure_loaded():
+    if _loaded_at is None or time.monotonic() - _loaded_at > RELOAD_INTERVAL:
+        _load()
+
+
+def _fetch_one(serial):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, serial_number, brand, size, status
+            FROM tv_inventory
+            WHERE serial_number = %s
+        """, (serial,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def _remove_available(serial):
+    i = bisect.bisect_left(_available, serial)
+    if i < len(_available) and _available[i] == serial:
+        del _available[i]
+
+
+def _add_available(serial):
+    i = bisect.bisect_left(_available, serial)
+    if i == len(_available) or _available[i] != serial:
+        _available.insert(i, serial)
+
+
+def _drop(tv_id):
+    # Caller holds _lock
+    serial = _by_id.pop(tv_id, None)
+    if serial is not None:
+        _by_serial.pop(serial, None)
+        _remove_available(serial)
+
+
+def lookup(serial):
+    _ensure_loaded()
+    now = time.monotonic()
+    with _lock:
+        tv = _by_serial.get(serial)
+        if tv is not None:
+            return tv
+        missed = _misses.get(serial)
+        if missed is not None and now - missed[0] < MISS_TTL:
+            return missed[1]
+
+    # Sold, or added by another worker since the last reload
+    tv = _fetch_one(serial)
+    if tv is not None and tv["status"] == "available":
+        put(tv)
+        return tv
+    with _lock:
+        _misses[serial] = (now, tv)
+        _misses.move_to_end(serial)
+        while len(_misses) > MAX_MISSES:
+            _misses.popitem(last=False)
+    return tv
+
+
+def complete(prefix, limit=MAX_COMPLETIONS):
+    _ensure_loaded()
+    limit = max(0, min(limit, MAX_COMPLETIONS))
+    with _lock:
+        i = bisect.bisect_left(_available, prefix)
+        results = []
+        while i < len(_available) and len(results) < limit and _available[i].startswith(prefix):
+            results.append(_available[i])
+            i += 1
+    return results
+
+
+# Write hooks, called by the inventory routes after commit
+
+def put(tv):
+    if _loaded_at is None:
+        return
+    tv = {
+        "id": tv["id"],
+        "serial_number": tv["serial_number"],
+        "brand": tv["brand"],
+        "size": tv["size"],
+        "status": tv["status"],
+    }
+    with _lock:
+        _drop(tv["id"])
+        _misses.pop(tv["serial_number"], None)
+        if tv["status"] == "available":
+            _by_serial[tv["serial_number"]] = tv
+            _by_id[tv["id"]] = tv["serial_number"]
+            _add_available(tv["serial_number"])
+
+
+def put_many(tvs):
+    for tv in tvs:
+        put(tv)
+
+
+def set_sold(tv_id):
+    if _loaded_at is None:
+        return
+    with _lock:
+        serial = _by_id.get(tv_id)
+        _drop(tv_id)
+        _misses.pop(serial, None)
@@ -0,0 +1,238 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+# Server-side sessions. The cookie holds only a random session id; the data
+# lives in SessionStore, an in-process LRU with an idle TTL, so the
+# per-request "user" in session check is a dict lookup. Sessions can be
+# counted and revoked (see /sessions).
+#
+# With IMS_SESSION_STORE set to a file path, sessions are also written to a
+# SQLite file there, which every worker on the host shares: a worker that
+# hasn't seen a session loads it from the file, and cached sessions are
+# re-read every RECHECK_SECONDS so a logout or revoke in another worker takes
+# effect within that time. Without it ("memory", the default) each process
+# has its own sessions, which suits a single worker.
+#
+# Idle expiry slides forward as the session is used. To keep requests from
+# writing to the file every time, the stored expiry is only pushed forward
+# once REFRESH_SECONDS have passed since the last write.
+
+STORE_PATH = os.environ.get("IMS_SESSION_STORE", "memory")
+TTL = int(os.environ.get("IMS_SESSION_TTL", 12 * 3600))
+MAX_ENTRIES = int(os.environ.get("IMS_SESSION_CACHE_SIZE", 10000))
+RECHECK_SECONDS = 30
+REFRESH_SECONDS = 300
+BUSY_TIMEOUT = 10
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT NOT NULL PRIMARY KEY,
+        user TEXT NULL,
+        data TEXT NOT NULL,
+        expires REAL NOT NULL
+    )
+"""
+
+
+class _Entry:
+    __slots__ = ("data", "user", "expires", "checked")
+
+    def __init__(self, data, user, expires, checked):
+        self.data = data
+        self.user = user
+        self.expires = expires
+        self.checked = checked
+
+
+class SessionStore:
+    def __init__(self, path=None, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> _Entry, least recently used first
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            self._db().execute(CREATE_TABLE_SQL)
+
+    def _db(self):
+        # One connection per thread; autocommit
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def _cache(self, sid, entry):
+        # Caller holds _lock
+        self._entries[sid] = entry
+        self._entries.move_to_end(sid)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, sid):
+        # Returns a copy of the session's data, or None if it is unknown or
+        # expired. Slides the expiry forward.
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                if entry.expires <= now:
+                    del self._entries[sid]
+                    entry = None
+                elif not self.path or now - entry.checked < RECHECK_SECONDS:
+                    self._entries.move_to_end(sid)
+                    refreshed = self._touch(entry, now)
+                    data = dict(entry.data)
+                else:
+                    entry = None
+        if entry is not None:
+            self._persist_expiry(sid, refreshed)
+            return data
+        if not self.path:
+            return None
+
+        row = self._db().execute(
+            "SELECT user, data, expires FROM sessions WHERE sid = ? AND expires > ?", (sid, now)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self._entries.pop(sid, None)
+                return None
+            entry = _Entry(session_json_serializer.loads(row[1]), row[0], row[2], now)
+            self._cache(sid, entry)
+            refreshed = self._touch(entry, now)
+            data = dict(entry.data)
+        self._persist_expiry(sid, refreshed)
+        return data
+
+    def _touch(self, entry, now):
+        # Caller holds _lock. Returns the new expiry if it moved.
+        if entry.expires - now > self.ttl - REFRESH_SECONDS:
+            return None
+        entry.expires = now + self.ttl
+        return entry.expires
+
+    def _persist_expiry(self, sid, expires):
+        if self.path and expires is not None:
+            self._db().execute("UPDATE sessions SET expires = ? WHERE sid = ?", (expires, sid))
+
+    def save(self, sid, data):
+        now = time.time()
+        entry = _Entry(dict(data), data.get("user"), now + self.ttl, now)
+        with self._lock:
+            self._cache(sid, entry)
+        if self.path:
+            self._db().execute(
+                "INSERT OR REPLACE INTO sessions (sid, user, data, expires) VALUES (?, ?, ?, ?)",
+                (sid, entry.user, session_json_serializer.dumps(entry.data), entry.expires)
+            )
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+        if self.path:
+            self._db().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def revoke_user(self, user):
+        # Ends every session of user; returns how many there were
+        with self._lock:
+            sids = [sid for sid, entry in self._entries.items() if entry.user == user]
+            for sid in sids:
+                del self._entries[sid]
+        if not self.path:
+            return len(sids)
+        return self._db().execute("DELETE FROM sessions WHERE user = ?", (user,)).rowcount
+
+    def purge(self):
+        # Drops expired sessions; returns how many went
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items() if entry.expires <= now]
+            for sid in expired:
+                del self._entries[sid]
+        if not self.path:
+            return len(expired)
+        return self._db().execute("DELETE FROM sessions WHERE expires <= ?", (now,)).rowcount
+
+    def counts(self):
+        # Live sessions per user (None for sessions without a login)
+        self.purge()
+        if self.path:
+            rows = self._db().execute("SELECT user, COUNT(*) FROM sessions GROUP BY user").fetchall()
+            return dict(rows)
+        counts = {}
+        with self._lock:
+            for entry in self._entries.values():
+                counts[entry.user] = counts.get(entry.user, 0) + 1
+        return counts
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.regenerated = False
+
+    def regenerate(self):
+        # New id for the same data; call on login so an id planted before
+        # login can't be used afterwards
+        self.regenerated = True
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        if session.regenerated and not session.new:
+            self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+        self.store.save(session.sid, session)
+        response.vary.add("Cookie")
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+store = SessionStore(None if STORE_PATH == "memory" else STORE_PATH)
@@ -0,0 +1,141 @@
+import stock_alerts
+import stock_ledger
+
+# Accessory stock per (item, location). Locations are rows in stock_locations,
+# so adding a technician is an INSERT there rather than a new column and new
+# code. Every change is a single conditional statement keyed on the
+# (item_name, location) primary key plus a stock_ledger row and a low-stock
+# check (stock_alerts); callers own the transaction.
+
+DEFAULT_LOCATION = "main"
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_locations (
+        name VARCHAR(50) NOT NULL PRIMARY KEY,
+        label VARCHAR(100) NOT NULL,
+        sort_order INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    INSERT IGNORE INTO stock_locations (name, label, sort_order) VALUES
+        ('main', 'Main Stock', 0),
+        ('prabhu', 'Prabhu', 1),
+        ('tamil', 'Tamil', 2)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS accessory_location_stock (
+        item_name VARCHAR(255) NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        qty INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_name, location),
+        KEY idx_accessory_location_stock_location (location),
+        CONSTRAINT fk_accessory_location_stock_location
+            FOREIGN KEY (location) REFERENCES stock_locations (name)
+    )
+    """,
+]
+
+# One-off copy of the legacy main_stock/prabhu_stock/tamil_stock columns
+MIGRATE_COLUMNS_SQL = [
+    f"""
+    INSERT IGNORE INTO accessory_location_stock (item_name, location, qty)
+    SELECT item_name, '{location}', {location}_stock FROM accessory_stock
+    """
+    for location in ("main", "prabhu", "tamil")
+] + [
+    # The legacy columns are no longer written; let new items leave them out
+    f"ALTER TABLE accessory_stock MODIFY {location}_stock INT NOT NULL DEFAULT 0"
+    for location in ("main", "prabhu", "tamil")
+]
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def locations(cursor):
+    cursor.execute("SELECT name, label FROM stock_locations ORDER BY sort_order, name")
+    return [
+        row if isinstance(row, dict) else {"name": row[0], "label": row[1]}
+        for row in cursor.fetchall()
+    ]
+
+
+def location_exists(cursor, location):
+    cursor.execute("SELECT 1 FROM stock_locations WHERE name = %s", (location,))
+    return cursor.fetchone() is not None
+
+
+def add(cursor, item_name, location, qty, reason, ref_id=None):
+    cursor.execute("""
+        INSERT INTO accessory_location_stock (item_name, location, qty)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE qty = qty + VALUES(qty)
+    """, (item_name, location, qty))
+    stock_ledger.record(cursor, [(item_name, location, qty, reason, ref_id)])
+    stock_alerts.check(cursor, [(item_name, location)])
+
+
+def take(cursor, item_name, location, qty, reason, ref_id=None):
+    # Decrements only if enough is on hand; returns False otherwise. The row
+    # lock lasts from this statement to commit, with no SELECT ... FOR UPDATE
+    # round trip in front of it.
+    cursor.execute("""
+        UPDATE accessory_location_stock
+        SET qty = qty - %s
+        WHERE item_name = %s AND location = %s AND qty >= %s
+    """, (qty, item_name, location, qty))
+    if cursor.rowcount != 1:
+        return False
+    stock_ledger.record(cursor, [(item_name, location, -qty, reason, ref_id)])
+    stock_alerts.check(cursor, [(item_name, location)])
+    return True
+
+
+def transfer(cursor, item_name, from_location, to_location, qty):
+    if not take(cursor, item_name, from_location, qty, "transfer_out"):
+        return False
+    add(cursor, item_name, to_location, qty, "transfer_in")
+    return True
+
+
+def take_many(cursor, lines, reason):
+    # lines: [(item_name, location, qty, ref_id)]. Locks every row involved in
+    # one statement, returns the shortfalls (and changes nothing) if any
+    # (item, location) can't be met, otherwise decrements them all in one
+    # batch and writes one ledger row per line.
+    needed = {}
+    for item, location, qty, _ in lines:
+        needed[(item, location)] = needed.get((item, location), 0) + qty
+
+    items = sorted({item for item, _ in needed})
+    cursor.execute(f"""
+        SELECT item_name, location, qty FROM accessory_location_stock
+        WHERE item_name IN ({_placeholders(items)})
+        FOR UPDATE
+    """, tuple(items))
+    on_hand = {}
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = (row["item_name"], row["location"], row["qty"])
+        on_hand[(row[0], row[1])] = row[2]
+
+    short = [
+        {"item": item, "location": location, "requested": qty, "available": on_hand.get((item, location), 0)}
+        for (item, location), qty in needed.items()
+        if on_hand.get((item, location), 0) < qty
+    ]
+    if short:
+        return short
+
+    cursor.executemany("""
+        UPDATE accessory_location_stock
+        SET qty = qty - %s
+        WHERE item_name = %s AND location = %s
+    """, [(qty, item, location) for (item, location), qty in needed.items()])
+    stock_ledger.record(cursor, [
+        (item, location, -qty, reason, ref_id) for item, location, qty, ref_id in lines
+    ])
+    stock_alerts.check(cursor, needed.keys())
+    return []
@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+
+from db_config import get_connection
+
+# Low-stock and aged-TV alerts.
+#
+# Low stock: an (item, location) is low while its qty is at or below its
+# threshold (a stock_thresholds row, else DEFAULT_THRESHOLD). stock.py calls
+# check() for the rows it just changed, in the same transaction. The open
+# state is the low_since column on accessory_location_stock itself, so the
+# check only touches rows the writer already holds locks on, and usually costs
+# a single keyed SELECT. Transitions are appended to stock_alert_events.
+#
+# Aged TVs: a unit is aged once it has been available for AGED_TV_DAYS. The
+# open list is a range read on (status, added_at). New events come from a
+# watermark, and each check reads only the units that aged since the last
+# one. Units that become available again through a deleted sale show up in
+# the open list but don't get a new event.
+
+DEFAULT_THRESHOLD = int(os.environ.get("IMS_LOW_STOCK_THRESHOLD", 0))
+AGED_TV_DAYS = int(os.environ.get("IMS_AGED_TV_DAYS", 90))
+AGED_CHECK_INTERVAL = 60
+FEED_LIMIT = 200
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_thresholds (
+        item_name VARCHAR(255) NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        min_qty INT NOT NULL,
+        PRIMARY KEY (item_name, location)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_alert_events (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        kind VARCHAR(20) NOT NULL,
+        state ENUM('raised', 'cleared') NOT NULL,
+        item_name VARCHAR(255) NOT NULL,
+        location VARCHAR(50) NULL,
+        serial_number VARCHAR(100) NULL,
+        qty INT NULL,
+        threshold INT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_alert_watermarks (
+        name VARCHAR(50) NOT NULL PRIMARY KEY,
+        value DATETIME NOT NULL
+    )
+    """,
+    "INSERT IGNORE INTO stock_alert_watermarks (name, value) VALUES ('aged_tv', '1970-01-01 00:00:00')",
+]
+
+# (table, index name, definition), as in migrations.HOT_PATH_INDEXES
+REQUIRED_INDEXES = [
+    ("tv_inventory", "idx_tv_inventory_status_added", "(status, added_at)"),
+]
+
+_aged_lock = threading.Lock()
+_last_aged_check = 0.0
+
+
+def _placeholders(keys):
+    return ", ".join(["(%s, %s)"] * len(keys))
+
+
+def initial_state_with(cursor):
+    # One-off evaluation of existing stock when the alerts are installed
+    cursor.execute("""
+        UPDATE accessory_location_stock
+        SET low_since = CURRENT_TIMESTAMP
+        WHERE qty <= COALESCE((
+            SELECT t.min_qty FROM stock_thresholds t
+            WHERE t.item_name = accessory_location_stock.item_name
+              AND t.location = accessory_location_stock.location
+        ), %s)
+    """, (DEFAULT_THRESHOLD,))
+
+
+def check(cursor, keys):
+    # keys: [(item_name, location)] whose qty just changed, locked by the
+    # caller's transaction. Raises or clears their low-stock alerts.
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    params = []
+    for item, location in keys:
+        params.extend((item, location))
+    cursor.execute(f"""
+        SELECT s.item_name, s.location, s.qty,
+               s.low_since IS NOT NULL AS is_low, COALESCE(t.min_qty, %s) AS threshold
+        FROM accessory_location_stock s
+        LEFT JOIN stock_thresholds t ON t.item_name = s.item_name AND t.location = s.location
+        WHERE (s.item_name, s.location) IN ({_placeholders(keys)})
+    """, (DEFAULT_THRESHOLD,) + tuple(params))
+    rows = [
+        (row["item_name"], row["location"], row["qty"], row["is_low"], row["threshold"])
+        if isinstance(row, dict) else row
+        for row in cursor.fetchall()
+    ]
+
+    raised = [row for row in rows if row[2] <= row[4] and not row[3]]
+    cleared = [row for row in rows if row[2] > row[4] and row[3]]
+    for changed, low_since, state in ((raised, "CURRENT_TIMESTAMP", "raised"), (cleared, "NULL", "cleared")):
+        if not changed:
+            continue
+        changed_keys = [(item, location) for item, location, *_ in changed]
+        params = []
+        for item, location in changed_keys:
+            params.extend((item, location))
+        cursor.execute(f"""
+            UPDATE accessory_location_stock SET low_since = {low_since}
+            WHERE (item_name, location) IN ({_placeholders(changed_keys)})
+        """, tuple(params))
+        cursor.executemany("""
+            INSERT INTO stock_alert_events (kind, state, item_name, location, qty, threshold)
+            VALUES ('low_stock', %s, %s, %s, %s, %s)
+        """, [(state, item, location, qty, threshold) for item, location, qty, _, threshold in changed])
+
+
+def set_threshold(cursor, item_name, location, min_qty):
+    # min_qty None removes the override. Re-checks the row under its lock.
+    if min_qty is None:
+        cursor.execute(
+            "DELETE FROM stock_thresholds WHERE item_name = %s AND location = %s",
+            (item_name, location)
+        )
+    else:
+        cursor.execute("""
+            INSERT INTO stock_thresholds (item_name, location, min_qty)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE min_qty = VALUES(min_qty)
+        """, (item_name, location, min_qty))
+    cursor.execute("""
+        SELECT qty FROM accessory_location_stock
+        WHERE item_name = %s AND location = %s
+        FOR UPDATE
+    """, (item_name, location))
+    if cursor.fetchall():
+        check(cursor, [(item_name, location)])
+
+
+def check_aged_with(cursor):
+    # Emits an event for every available unit that crossed AGED_TV_DAYS since
+    # the watermark, then moves the watermark. The FOR UPDATE on the
+    # watermark row keeps two processes from emitting the same events.
+    cursor.execute("SELECT value FROM stock_alert_watermarks WHERE name = 'aged_tv' FOR UPDATE")
+    last = cursor.fetchone()[0]
+    cursor.execute("SELECT CURRENT_TIMESTAMP - INTERVAL %s DAY", (AGED_TV_DAYS,))
+    cutoff = cursor.fetchone()[0]
+    if cutoff <= last:
+        return 0
+    cursor.execute("""
+        INSERT INTO stock_alert_events (kind, state, item_name, serial_number, threshold)
+        SELECT 'aged_tv', 'raised', CONCAT(brand, ' ', size), serial_number, %s
+        FROM tv_inventory
+        WHERE status = 'available' AND added_at > %s AND added_at <= %s
+    """, (AGED_TV_DAYS, last, cutoff))
+    emitted = cursor.rowcount
+    cursor.execute("UPDATE stock_alert_watermarks SET value = %s WHERE name = 'aged_tv'", (cutoff,))
+    return emitted
+
+
+def maybe_check_aged():
+    # Runs check_aged_with at most once per AGED_CHECK_INTERVAL per process
+    global _last_aged_check
+    now = time.monotonic()
+    if now - _last_aged_check < AGED_CHECK_INTERVAL or not _aged_lock.acquire(blocking=False):
+        return
+    try:
+        _last_aged_check = now
+        conn = get_connection()
+        try:
+            check_aged_with(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+    finally:
+        _aged_lock.release()
+
+
+def events(cursor, after_id=0, limit=FEED_LIMIT):
+    cursor.execute("""
+        SELECT id, kind, state, item_name, location, serial_number, qty, threshold, created_at
+        FROM stock_alert_events
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    """, (after_id, limit))
+    return cursor.fetchall()
+
+
+def open_alerts(cursor, aged_limit=FEED_LIMIT):
+    # Returns (low stock rows, the aged_limit oldest aged TVs, number of aged
+    # TVs in all)
+    cursor.execute("""
+        SELECT s.item_name, s.location, s.qty, COALESCE(t.min_qty, %s) AS threshold, s.low_since
+        FROM accessory_location_stock s
+        LEFT JOIN stock_thresholds t ON t.item_name = s.item_name AND t.location = s.location
+        WHERE s.low_since IS NOT NULL
+        ORDER BY s.item_name, s.location
+    """, (DEFAULT_THRESHOLD,))
+    low_stock = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT id, serial_number, brand, size, added_at,
+               TIMESTAMPDIFF(DAY, added_at, CURRENT_TIMESTAMP) AS age_days
+        FROM tv_inventory
+        WHERE status = 'available' AND added_at <= CURRENT_TIMESTAMP - INTERVAL %s DAY
+        ORDER BY added_at, id
+        LIMIT %s
+    """, (AGED_TV_DAYS, aged_limit))
+    aged_tvs = cursor.fetchall()
+
+    aged_total = len(aged_tvs)
+    if aged_total == aged_limit:
+        cursor.execute("""
+            SELECT COUNT(*) AS total
+            FROM tv_inventory
+            WHERE status = 'available' AND added_at <= CURRENT_TIMESTAMP - INTERVAL %s DAY
+        """, (AGED_TV_DAYS,))
+        row = cursor.fetchone()
+        aged_total = row["total"] if isinstance(row, dict) else row[0]
+    return low_stock, aged_tvs, aged_total
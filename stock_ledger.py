@@ -0,0 +1,157 @@
+import sys
+import threading
+import time
+
+from db_config import get_connection
+
+# Append-only record of every accessory stock movement, written by stock.py in
+# the same transaction as the quantity change. Snapshots store the full
+# per-(item, location) quantities as of a ledger position, so stock on a past
+# date is the nearest earlier snapshot plus the ledger rows after it.
+
+# How often a process takes a snapshot on its own (see maybe_snapshot)
+SNAPSHOT_INTERVAL = 24 * 60 * 60
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_ledger (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        item_name VARCHAR(255) NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        delta INT NOT NULL,
+        reason VARCHAR(30) NOT NULL,
+        ref_id INT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_stock_ledger_created (created_at),
+        KEY idx_stock_ledger_item (item_name, location, id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_snapshots (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_ledger_id BIGINT NOT NULL,
+        KEY idx_stock_snapshots_taken (taken_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_snapshot_rows (
+        snapshot_id INT NOT NULL,
+        item_name VARCHAR(255) NOT NULL,
+        location VARCHAR(50) NOT NULL,
+        qty INT NOT NULL,
+        PRIMARY KEY (snapshot_id, item_name, location)
+    )
+    """,
+]
+
+_snapshot_lock = threading.Lock()
+_last_snapshot_check = 0.0
+
+
+def record(cursor, entries):
+    # entries: [(item_name, location, delta, reason, ref_id)]
+    if not entries:
+        return
+    cursor.executemany("""
+        INSERT INTO stock_ledger (item_name, location, delta, reason, ref_id)
+        VALUES (%s, %s, %s, %s, %s)
+    """, entries)
+
+
+def take_snapshot_with(cursor):
+    # Locking reads: wait for in-flight stock writers to commit and block new
+    # ones until this transaction ends, so the quantities and the ledger
+    # position describe the same instant.
+    cursor.execute("""
+        SELECT item_name, location, qty FROM accessory_location_stock
+        LOCK IN SHARE MODE
+    """)
+    rows = cursor.fetchall()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stock_ledger LOCK IN SHARE MODE")
+    last_ledger_id = cursor.fetchone()[0]
+
+    cursor.execute("INSERT INTO stock_snapshots (last_ledger_id) VALUES (%s)", (last_ledger_id,))
+    snapshot_id = cursor.lastrowid
+    cursor.executemany("""
+        INSERT INTO stock_snapshot_rows (snapshot_id, item_name, location, qty)
+        VALUES (%s, %s, %s, %s)
+    """, [(snapshot_id, item, location, qty) for item, location, qty in rows])
+    return snapshot_id
+
+
+def take_snapshot():
+    conn = get_connection()
+    try:
+        snapshot_id = take_snapshot_with(conn.cursor())
+        conn.commit()
+        return snapshot_id
+    finally:
+        conn.close()
+
+
+def maybe_snapshot():
+    # Called after stock writes; takes a snapshot when the newest one is older
+    # than SNAPSHOT_INTERVAL. Checks the database at most once an hour per
+    # process so the write path stays cheap.
+    global _last_snapshot_check
+    now = time.monotonic()
+    if now - _last_snapshot_check < 3600 or not _snapshot_lock.acquire(blocking=False):
+        return
+    try:
+        _last_snapshot_check = now
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT TIMESTAMPDIFF(SECOND, MAX(taken_at), CURRENT_TIMESTAMP)
+                FROM stock_snapshots
+            """)
+            age = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        if age is None or age > SNAPSHOT_INTERVAL:
+            take_snapshot()
+    finally:
+        _snapshot_lock.release()
+
+
+def stock_as_of(cursor, as_of, item_name=None):
+    # Quantities per (item, location) at as_of (a datetime string): the latest
+    # snapshot taken at or before as_of, plus the ledger rows after it up to
+    # as_of. Returns None if there is no snapshot that early.
+    cursor.execute("""
+        SELECT id, last_ledger_id FROM stock_snapshots
+        WHERE taken_at <= %s
+        ORDER BY taken_at DESC, id DESC
+        LIMIT 1
+    """, (as_of,))
+    snapshot = cursor.fetchone()
+    if snapshot is None:
+        return None
+    snapshot_id, last_ledger_id = snapshot
+
+    item_filter = " AND item_name = %s" if item_name else ""
+    item_params = (item_name,) if item_name else ()
+
+    cursor.execute(
+        "SELECT item_name, location, qty FROM stock_snapshot_rows WHERE snapshot_id = %s" + item_filter,
+        (snapshot_id,) + item_params
+    )
+    quantities = {(item, location): qty for item, location, qty in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT item_name, location, SUM(delta) FROM stock_ledger
+        WHERE id > %s AND created_at <= %s
+    """ + item_filter + " GROUP BY item_name, location", (last_ledger_id, as_of) + item_params)
+    for item, location, delta in cursor.fetchall():
+        quantities[(item, location)] = quantities.get((item, location), 0) + int(delta)
+
+    return quantities
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["snapshot"]:
+        print(f"Took snapshot {take_snapshot()}")
+    else:
+        print("Usage: python stock_ledger.py snapshot")
@@ -0,0 +1,156 @@
+import csv
+import io
+import zipfile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+import inventory_changes
+
+# Accepted header spellings for each field
+HEADERS = {
+    "serial_number": ("serial", "serial_number", "serial number", "serial-number"),
+    "brand": ("brand", "tv_brand", "tv brand", "tv-brand"),
+    "size": ("size", "tv_size", "tv size", "tv-size"),
+}
+MAX_ROWS = 5000
+# Serials per IN (...) list when checking for duplicates
+LOOKUP_CHUNK = 1000
+
+
+class TVImportError(Exception):
+    pass
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_rows(upload):
+    # Returns the data rows of an uploaded .csv or .xlsx as lists of strings,
+    # header row first.
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".xlsx"):
+        try:
+            workbook = load_workbook(upload.stream, read_only=True, data_only=True)
+            sheet = workbook.active
+            rows = [[_cell(v) for v in row] for row in sheet.iter_rows(values_only=True)]
+            workbook.close()
+        except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+            raise TVImportError(f"Not a readable .xlsx file: {e}")
+    elif filename.endswith(".csv"):
+        text = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        try:
+            rows = [[_cell(v) for v in row] for row in csv.reader(text)]
+        except UnicodeDecodeError:
+            raise TVImportError("The CSV file must be UTF-8 encoded")
+        except csv.Error as e:
+            raise TVImportError(f"Malformed CSV file: {e}")
+    else:
+        raise TVImportError("Upload a .csv or .xlsx file")
+
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        raise TVImportError("The file is empty")
+    if len(rows) - 1 > MAX_ROWS:
+        raise TVImportError(f"At most {MAX_ROWS} rows per import")
+    return rows
+
+
+def _columns(header):
+    lowered = [h.lower() for h in header]
+    columns = {}
+    for field, names in HEADERS.items():
+        for name in names:
+            if name in lowered:
+                columns[field] = lowered.index(name)
+                break
+        else:
+            raise TVImportError(f"Missing column: {field}")
+    return columns
+
+
+def _key(serial):
+    # The unique index on serial_number is case-insensitive
+    return serial.upper()
+
+
+def _existing_serials(cursor, serials):
+    # Returns the keys (see _key) of the serials already in tv_inventory
+    existing = set()
+    for i in range(0, len(serials), LOOKUP_CHUNK):
+        chunk = serials[i:i + LOOKUP_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"SELECT serial_number FROM tv_inventory WHERE serial_number IN ({placeholders})",
+            tuple(chunk)
+        )
+        existing.update(_key(row[0]) for row in cursor.fetchall())
+    return existing
+
+
+def _inserted(cursor, serials):
+    # The rows of just-inserted serials, for serial_index.put_many
+    units = []
+    for i in range(0, len(serials), LOOKUP_CHUNK):
+        chunk = serials[i:i + LOOKUP_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"""
+            SELECT id, serial_number, brand, size, status
+            FROM tv_inventory WHERE serial_number IN ({placeholders})
+        """, tuple(chunk))
+        units.extend(
+            {"id": row[0], "serial_number": row[1], "brand": row[2], "size": row[3], "status": row[4]}
+            for row in cursor.fetchall()
+        )
+    return units
+
+
+def import_rows(conn, rows):
+    # Validates every row, then inserts the accepted ones with one executemany
+    # in a single transaction. Returns the per-row report and the inserted
+    # units (id, serial_number, brand, size, status); the caller commits.
+    columns = _columns(rows[0])
+    cursor = conn.cursor()
+
+    report = []
+    candidates = []
+    seen = set()
+    for line, row in enumerate(rows[1:], start=2):
+        values = {field: row[i] if i < len(row) else "" for field, i in columns.items()}
+        entry = {"row": line, "serial_number": values["serial_number"]}
+        missing = [field for field, value in values.items() if not value]
+        if missing:
+            entry.update(status="rejected", reason=f"Missing {', '.join(missing)}")
+        elif _key(values["serial_number"]) in seen:
+            entry.update(status="rejected", reason="Duplicate serial in file")
+        else:
+            seen.add(_key(values["serial_number"]))
+            candidates.append((entry, values))
+        report.append(entry)
+
+    existing = _existing_serials(cursor, [values["serial_number"] for _, values in candidates])
+
+    accepted = []
+    for entry, values in candidates:
+        if _key(values["serial_number"]) in existing:
+            entry.update(status="rejected", reason="Serial already in inventory")
+        else:
+            entry.update(status="accepted")
+            accepted.append((values["serial_number"], values["brand"], values["size"]))
+
+    if accepted:
+        cursor.executemany("""
+            INSERT INTO tv_inventory (serial_number, brand, size, status)
+            VALUES (%s, %s, %s, 'available')
+        """, accepted)
+        serials = [serial for serial, _, _ in accepted]
+        added = _inserted(cursor, serials)
+        inventory_changes.record_added_many(cursor, serials)
+        return report, added
+
+    return report, []
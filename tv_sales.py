@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+
+import inventory_changes
+import sales_rollup
+from orders import CHANNELS
+
+# Single-TV sale submission for the b2c/b2b forms, in two locking modes:
+#
+#   pessimistic  SELECT ... FOR UPDATE, INSERT the sale, UPDATE the unit; the
+#                unit's row lock is held from the first statement to commit.
+#   optimistic   read the unit without locking and INSERT the sale, then
+#                claim the unit with one conditional UPDATE (status =
+#                'available') and check the affected rows, rolling the sale
+#                back if it lost. The unit is only locked for the change log
+#                entry, rollup update and commit. Losing the race to another
+#                clerk is reported the same as "already sold".
+#
+# In both modes the daily rollup row, which every sale of that kind that day
+# shares, is updated last so it is held only for the commit.
+#
+# Both modes time the statement that locks the unit (lock wait) and the time
+# from getting it to commit (lock held), and the same for the rollup row;
+# lock_stats() returns the totals per mode.
+
+LOCK_MODES = ("optimistic", "pessimistic")
+DEFAULT_LOCK_MODE = os.environ.get("IMS_TV_SALE_LOCK_MODE", "optimistic")
+
+_stats_lock = threading.Lock()
+_stats = {
+    mode: {
+        "sales": 0, "conflicts": 0, "wait_total": 0.0, "wait_max": 0.0, "held_total": 0.0, "held_max": 0.0,
+        "rollup_wait_total": 0.0, "rollup_wait_max": 0.0, "rollup_held_total": 0.0, "rollup_held_max": 0.0,
+    }
+    for mode in LOCK_MODES
+}
+
+
+def parse_mode(value):
+    return value if value in LOCK_MODES else DEFAULT_LOCK_MODE
+
+
+def _record(mode, wait, held=None, rollup_wait=0.0, rollup_held=0.0):
+    with _stats_lock:
+        stats = _stats[mode]
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
+        if held is None:
+            stats["conflicts"] += 1
+        else:
+            stats["sales"] += 1
+            for key, value in (("held", held), ("rollup_wait", rollup_wait), ("rollup_held", rollup_held)):
+                stats[f"{key}_total"] += value
+                stats[f"{key}_max"] = max(stats[f"{key}_max"], value)
+
+
+def _avg_ms(total, count):
+    return round(total / count * 1000, 3) if count else 0.0
+
+
+def lock_stats():
+    with _stats_lock:
+        result = {}
+        for mode, stats in _stats.items():
+            attempts = stats["sales"] + stats["conflicts"]
+            result[mode] = {
+                "sales": stats["sales"],
+                "conflicts": stats["conflicts"],
+                "avg_wait_ms": _avg_ms(stats["wait_total"], attempts),
+                "max_wait_ms": round(stats["wait_max"] * 1000, 3),
+                "avg_held_ms": _avg_ms(stats["held_total"], stats["sales"]),
+                "max_held_ms": round(stats["held_max"] * 1000, 3),
+                "avg_rollup_wait_ms": _avg_ms(stats["rollup_wait_total"], stats["sales"]),
+                "max_rollup_wait_ms": round(stats["rollup_wait_max"] * 1000, 3),
+                "avg_rollup_held_ms": _avg_ms(stats["rollup_held_total"], stats["sales"]),
+                "max_rollup_held_ms": round(stats["rollup_held_max"] * 1000, 3),
+            }
+        return result
+
+
+def _lock_pessimistic(cursor, serial):
+    cursor.execute("""
+        SELECT id, brand, size FROM tv_inventory
+        WHERE serial_number = %s AND status = 'available'
+        FOR UPDATE
+    """, (serial,))
+    return cursor.fetchone()
+
+
+def _claim_optimistic(cursor, tv):
+    cursor.execute("""
+        UPDATE tv_inventory
+        SET status = 'sold'
+        WHERE id = %s AND status = 'available'
+    """, (tv["id"],))
+    return cursor.rowcount == 1
+
+
+def _insert_sale(cursor, table, name_col, tv, sale):
+    cursor.execute(f"""
+        INSERT INTO {table} (
+            product_id, {name_col}, phone, price, sale_date, warranty, brand, size
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        tv["id"],
+        sale.get("name"),
+        sale.get("phone"),
+        sale.get("price"),
+        sale.get("date"),
+        sale.get("warranty"),
+        tv["brand"],
+        tv["size"]
+    ))
+    return cursor.lastrowid
+
+
+def sell(conn, channel, serial, sale, mode):
+    # Sells one available unit and commits. sale holds the form fields (name,
+    # phone, price, date, warranty). Returns the sold TV (id, brand, size), or
+    # None after rolling back if the unit isn't available.
+    table, name_col = CHANNELS[channel]
+    cursor = conn.cursor(dictionary=True)
+
+    if mode == "optimistic":
+        cursor.execute("""
+            SELECT id, brand, size FROM tv_inventory
+            WHERE serial_number = %s AND status = 'available'
+        """, (serial,))
+        tv = cursor.fetchone()
+        if not tv:
+            conn.rollback()
+            return None
+        sale_id = _insert_sale(cursor, table, name_col, tv, sale)
+        started = time.perf_counter()
+        claimed = _claim_optimistic(cursor, tv)
+        locked = time.perf_counter()
+    else:
+        started = time.perf_counter()
+        tv = _lock_pessimistic(cursor, serial)
+        claimed = tv is not None
+        locked = time.perf_counter()
+        if claimed:
+            sale_id = _insert_sale(cursor, table, name_col, tv, sale)
+            cursor.execute("""
+                UPDATE tv_inventory
+                SET status = 'sold'
+                WHERE id = %s
+            """, (tv["id"],))
+
+    if not claimed:
+        conn.rollback()
+        _record(mode, locked - started)
+        return None
+
+    inventory_changes.record_removed(cursor, serial)
+
+    rollup_started = time.perf_counter()
+    sales_rollup.add_sales(cursor, f"{channel}_tv", [sale_id])
+    rollup_locked = time.perf_counter()
+
+    conn.commit()
+    done = time.perf_counter()
+    _record(mode, locked - started, done - locked, rollup_locked - rollup_started, done - rollup_locked)
+    return tv